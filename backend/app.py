@@ -12,6 +12,7 @@ from services.recommendation_service import RecommendationService
 from services.session_service import SessionService
 from services.user_service import UserService, UserPreferences, ActivityProgress
 from redis import Redis
+from redis.asyncio import Redis as AsyncRedis
 from models.user import UserCreate, UserResponse, Token
 from services.auth_service import auth_service
 from services.database import db
@@ -135,7 +136,17 @@ except Exception as e:
 emotion_service = EmotionService()
 recommendation_service = RecommendationService()
 session_service = SessionService()
-user_service = UserService(redis_client if redis_available else None)
+# UserService runs on the event loop, so it gets an asyncio client
+user_service = UserService(
+    AsyncRedis(
+        host='redis',
+        port=6379,
+        db=0,
+        decode_responses=True,
+        socket_connect_timeout=2,
+        socket_timeout=2
+    ) if redis_available else None
+)
 
 # OAuth2 scheme for token authentication
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
@@ -158,6 +169,12 @@ class EmotionResponse(BaseModel):
     primary_emotion: str
     summary: str
 
+class BatchTextInput(BaseModel):
+    texts: List[str]
+
+class BatchEmotionResponse(BaseModel):
+    results: List[EmotionResponse]
+
 class Activity(BaseModel):
     title: str
     description: str
@@ -237,6 +254,7 @@ async def root():
         "version": "1.0.0",
         "endpoints": {
             "/analyze": "Analyze emotions in text",
+            "/analyze/batch": "Analyze emotions in several texts at once",
             "/recommend": "Get personalized wellness recommendations",
             "/metrics": "View Prometheus metrics",
             "/health": "Check service health"
@@ -289,6 +307,30 @@ async def analyze_emotion(input_data: TextInput, session_id: Optional[str] = Non
             "summary": fallback_summary
         }
 
+@app.post("/analyze/batch", response_model=BatchEmotionResponse)
+async def analyze_emotions_batch(input_data: BatchTextInput):
+    """
+    Analyze the emotions in several texts in a single request.
+    Results are returned in the same order as the input texts.
+    """
+    logger.info(f"Analyzing emotions for a batch of {len(input_data.texts)} texts")
+    
+    try:
+        results = [
+            {
+                "emotions": emotions,
+                "primary_emotion": primary_emotion,
+                "summary": emotion_service.get_emotion_summary(emotions)
+            }
+            for emotions, primary_emotion in emotion_service.batch_detect_emotions(input_data.texts)
+        ]
+        EMOTION_ANALYSIS_COUNT.labels(status="success").inc(len(results))
+        return {"results": results}
+    except Exception as e:
+        logger.error(f"Error in batch emotion analysis: {str(e)}")
+        EMOTION_ANALYSIS_COUNT.labels(status="error").inc()
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.post("/recommend", response_model=RecommendationResponse)
 async def get_recommendations(emotion_data: EmotionResponse, session_id: Optional[str] = None):
     """
@@ -479,6 +521,8 @@ async def get_session(session_id: str):
         session_data["session_id"] = session_id
         
         return session_data
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error getting session: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -491,6 +535,8 @@ async def update_preferences(session_id: str, preferences: UserPreferences):
         if not success:
             raise HTTPException(status_code=404, detail="Session not found")
         return {"message": "Preferences updated successfully"}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error updating preferences: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -533,6 +579,8 @@ async def delete_session(session_id: str):
         if not success:
             raise HTTPException(status_code=404, detail="Session not found")
         return {"message": "Session deleted successfully"}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error deleting session: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -552,7 +600,7 @@ async def get_favorites(session_id: str):
     """Get list of favorite activities."""
     try:
         favorites = await user_service.get_favorites(session_id)
-        return {"favorites": favorites}
+        return {"favorites": list(favorites)}
     except Exception as e:
         logger.error(f"Error getting favorites: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to get favorites")
@@ -629,7 +677,8 @@ async def get_recommendations(session_id: str, limit: int = 5):
         recommendations = await user_service.generate_recommendations(
             session_id,
             all_activities,
-            limit
+            limit,
+            activity_table=recommendation_service.get_activity_table()
         )
         
         return {"recommendations": recommendations}
@@ -1,5 +1,11 @@
 #!/bin/bash
 
+# The load tests are independent and can also be run on their own in parallel:
+#   pytest tests/ -m load -n auto --asyncio-mode=auto
+# The rest of the suite can be sharded the same way (e.g. -n 8); each xdist
+# worker is its own process with its own in-memory FakeServer, so tests reusing
+# keys like test_user don't collide.
+
 # Run all tests with coverage
 pytest tests/ \
     --cov=. \
@@ -1,4 +1,5 @@
 from datetime import datetime, timedelta
+from functools import lru_cache
 from typing import Optional, Dict, Any
 from jose import JWTError, jwt
 from passlib.context import CryptContext
@@ -6,6 +7,7 @@ from fastapi import HTTPException, status
 from models.user import UserCreate, UserInDB, Token, TokenData
 import uuid
 import os
+import time
 from dotenv import load_dotenv
 from .database import db
 
@@ -19,6 +21,11 @@ REFRESH_TOKEN_EXPIRE_DAYS = 7
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+@lru_cache(maxsize=1024)
+def _decode_token(token: str) -> Dict[str, Any]:
+    """Verify and decode a JWT, memoized per token string so repeat requests skip the HMAC."""
+    return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+
 class AuthService:
     def __init__(self):
         self.db = db
@@ -63,7 +70,10 @@ class AuthService:
 
     async def verify_token(self, token: str) -> TokenData:
         try:
-            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+            payload = _decode_token(token)
+            # A cached payload was valid when decoded; re-check expiry on every use
+            if payload.get("exp") is not None and payload["exp"] <= time.time():
+                raise JWTError("Signature has expired.")
             user_id: str = payload.get("sub")
             email: str = payload.get("email")
             if user_id is None or email is None:
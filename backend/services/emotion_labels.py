@@ -0,0 +1,8 @@
+# Canonical emotion label order, shared by the model head and packed session records
+EMOTION_LABELS = (
+    "neutral", "approval", "admiration", "annoyance", "gratitude",
+    "disapproval", "curiosity", "amusement", "realization", "optimism",
+    "disappointment", "love", "anger", "joy", "confusion", "sadness",
+    "caring", "excitement", "surprise", "disgust", "desire", "fear",
+    "remorse", "embarrassment", "nervousness", "pride", "relief", "grief"
+)
@@ -1,23 +1,20 @@
 from transformers import AutoTokenizer, AutoModelForSequenceClassification
 import torch
 import numpy as np
-from typing import Dict, Tuple, List
+from typing import Dict, Tuple, List, Union
 import redis
 import json
 from functools import lru_cache
 
+from .emotion_labels import EMOTION_LABELS
+
 class EmotionService:
+    emotion_labels = EMOTION_LABELS
+
     def __init__(self):
         self.model_name = "distilbert-base-uncased"  # We'll fine-tune this for our emotions
         self.tokenizer = None
         self.model = None
-        self.emotion_labels = [
-            "neutral", "approval", "admiration", "annoyance", "gratitude",
-            "disapproval", "curiosity", "amusement", "realization", "optimism",
-            "disappointment", "love", "anger", "joy", "confusion", "sadness",
-            "caring", "excitement", "surprise", "disgust", "desire", "fear",
-            "remorse", "embarrassment", "nervousness", "pride", "relief", "grief"
-        ]
         # Initialize in-memory cache
         self.memory_cache = {}
         
@@ -86,7 +83,7 @@ class EmotionService:
             self.model = None
             self.tokenizer = None
 
-    def preprocess_text(self, text: str) -> torch.Tensor:
+    def preprocess_text(self, text: Union[str, List[str]]) -> torch.Tensor:
         """Preprocess the input text for the model."""
         inputs = self.tokenizer(
             text,
@@ -286,8 +283,37 @@ class EmotionService:
 
     def batch_detect_emotions(self, texts: List[str]) -> List[Tuple[Dict[str, float], str]]:
         """Process multiple texts in batch for better performance."""
-        results = []
-        for text in texts:
-            emotions, primary = self.detect_emotions(text)
-            results.append((emotions, primary))
-        return results 
\ No newline at end of file
+        results = [None] * len(texts)
+        uncached = []
+        for i, text in enumerate(texts):
+            cached_emotions, cached_primary = self._get_cached_emotions(text)
+            if cached_emotions and cached_primary:
+                results[i] = (cached_emotions, cached_primary)
+            else:
+                uncached.append(i)
+
+        if uncached and self.model and self.tokenizer:
+            try:
+                # Tokenize the cache misses together and run a single forward pass
+                inputs = self.preprocess_text([texts[i] for i in uncached])
+                with torch.no_grad():
+                    logits = self.model(**inputs).logits
+                batch_probs = torch.nn.functional.softmax(logits, dim=1).tolist()
+
+                for i, probs in zip(uncached, batch_probs):
+                    emotions = {
+                        self.emotion_labels[j]: prob
+                        for j, prob in enumerate(probs)
+                        if prob > 0.05  # Only include emotions with significant probability
+                    }
+                    primary_emotion = self.emotion_labels[probs.index(max(probs))]
+                    self._cache_emotions(texts[i], emotions, primary_emotion)
+                    results[i] = (emotions, primary_emotion)
+                uncached = []
+            except Exception as e:
+                print(f"Error in batch emotion detection: {str(e)}. Falling back to per-text detection.")
+
+        # Keyword fallback (or batch failure) goes through the single-text path
+        for i in uncached:
+            results[i] = self.detect_emotions(texts[i])
+        return results
@@ -3,9 +3,12 @@ import json
 import os
 from pathlib import Path
 
+from .user_service import build_activity_table
+
 class RecommendationService:
     def __init__(self):
         self.activities = self._load_activities()
+        self._activity_table = None
         self.emotion_mappings = self._create_emotion_mappings()
         self.difficulty_levels = ["beginner", "intermediate", "advanced"]
         self.time_requirements = ["short", "medium", "long"]
@@ -387,6 +390,12 @@ class RecommendationService:
             activities_with_ids.append(activity_with_id)
         return activities_with_ids
         
+    def get_activity_table(self) -> Dict:
+        """Scoring columns for get_all_activities(), built once per catalog."""
+        if self._activity_table is None:
+            self._activity_table = build_activity_table(self.get_all_activities())
+        return self._activity_table
+
     def get_activity(self, activity_id: str) -> Dict:
         """Get a specific activity by ID."""
         if activity_id in self.activities:
@@ -1,18 +1,96 @@
 from typing import Dict, List, Optional
 import redis
 import json
+import base64
+import struct
 from datetime import datetime, timedelta
 import uuid
 
+import numpy as np
+
+from .emotion_labels import EMOTION_LABELS
+
+# Canonical label order for packed emotion records
+EMOTION_ORDER = EMOTION_LABELS
+_EMOTION_INDEX = {label: i for i, label in enumerate(EMOTION_ORDER)}
+_EMOTION_PAIR = struct.Struct("<Be")  # label index byte + little-endian float16 score
+
+SIGNIFICANT_EMOTION_SCORE = 0.1  # Scores above this count towards emotion trends
+
+def _to_float16(score: float) -> float:
+    """Round a score to float16 without moving it across the trend threshold."""
+    packed = np.float16(score)
+    if (packed > SIGNIFICANT_EMOTION_SCORE) != (score > SIGNIFICANT_EMOTION_SCORE):
+        packed = np.nextafter(packed, np.float16(np.inf if score > SIGNIFICANT_EMOTION_SCORE else -np.inf))
+    return float(packed)
+
+def pack_emotions(emotions: Dict[str, float]) -> str:
+    """Pack non-zero emotion scores as base64 (label index, float16) pairs."""
+    pairs = [(_EMOTION_INDEX[label], _to_float16(score)) for label, score in emotions.items()
+             if score and label in _EMOTION_INDEX]
+    packed = struct.pack("<" + "Be" * len(pairs), *(v for pair in pairs for v in pair))
+    return base64.b64encode(packed).decode("ascii")
+
+def unpack_emotions(packed: str) -> Dict[str, float]:
+    """Inverse of pack_emotions; scores that round to zero are dropped."""
+    return {EMOTION_ORDER[i]: score
+            for i, score in _EMOTION_PAIR.iter_unpack(base64.b64decode(packed)) if score}
+
+class MemorySessionBackend:
+    """In-memory session storage."""
+
+    def __init__(self):
+        self.sessions = {}
+        self.user_sessions = {}
+
+    def get_session(self, session_key: str) -> Optional[Dict]:
+        return self.sessions.get(session_key)
+
+    def set_session(self, session_key: str, session_data: Dict, expiry_s: int) -> None:
+        self.sessions[session_key] = session_data
+
+    def set_user_session(self, user_session_key: str, session_id: str, expiry_s: int) -> None:
+        self.user_sessions[user_session_key] = session_id
+
+    def delete_session(self, session_key: str, user_session_key: str) -> None:
+        self.sessions.pop(session_key, None)
+        self.user_sessions.pop(user_session_key, None)
+
+class RedisSessionBackend:
+    """Redis session storage, written through to an in-memory backup."""
+
+    def __init__(self, redis_client: redis.Redis, backup: MemorySessionBackend):
+        self.redis_client = redis_client
+        self.backup = backup
+
+    def get_session(self, session_key: str) -> Optional[Dict]:
+        session_data = self.redis_client.get(session_key)
+        if session_data:
+            return json.loads(session_data)
+        return self.backup.get_session(session_key)
+
+    def set_session(self, session_key: str, session_data: Dict, expiry_s: int) -> None:
+        self.redis_client.setex(session_key, expiry_s, json.dumps(session_data))
+        self.backup.set_session(session_key, session_data, expiry_s)
+
+    def set_user_session(self, user_session_key: str, session_id: str, expiry_s: int) -> None:
+        self.redis_client.setex(user_session_key, expiry_s, session_id)
+        self.backup.set_user_session(user_session_key, session_id, expiry_s)
+
+    def delete_session(self, session_key: str, user_session_key: str) -> None:
+        self.redis_client.delete(session_key, user_session_key)
+        self.backup.delete_session(session_key, user_session_key)
+
 class SessionService:
     def __init__(self):
         self.session_expiry = timedelta(days=30)  # Sessions expire after 30 days
-        self.sessions = {}  # Initialize in-memory storage for sessions
-        self.user_sessions = {}  # Initialize in-memory storage for user sessions
+        self._expiry_s = int(self.session_expiry.total_seconds())  # TTL in seconds for Redis writes
+        self.memory_backend = MemorySessionBackend()
+        self.backend = self.memory_backend
         
         # Try to connect to Redis, but don't fail if it's not available
         try:
-            self.redis_client = redis.Redis(
+            redis_client = redis.Redis(
                 host='redis',
                 port=6379,
                 db=1,
@@ -21,12 +99,28 @@ class SessionService:
                 socket_timeout=2
             )
             # Test the connection
-            self.redis_client.ping()
-            self.redis_available = True
+            redis_client.ping()
+            self.backend = RedisSessionBackend(redis_client, self.memory_backend)
             print("Successfully connected to Redis for session management")
         except Exception as e:
             print(f"Redis not available: {str(e)}. Using in-memory session storage instead.")
-            self.redis_available = False
+
+    @property
+    def redis_available(self) -> bool:
+        return self.backend is not self.memory_backend
+
+    def _call(self, op: str, *args):
+        """Run a backend operation, falling back to in-memory storage if Redis fails."""
+        try:
+            return getattr(self.backend, op)(*args)
+        except Exception as e:
+            if self.backend is self.memory_backend:
+                raise
+            print(f"Error in Redis session storage ({op}): {str(e)}")
+            print("Falling back to in-memory storage")
+            # Disable Redis for future operations
+            self.backend = self.memory_backend
+            return getattr(self.backend, op)(*args)
 
     def create_session(self, user_id: str) -> str:
         """Create a new session for a user."""
@@ -47,33 +141,8 @@ class SessionService:
         session_key = f"session:{session_id}"
         user_session_key = f"user_sessions:{user_id}"
         
-        # Try to store in Redis if available
-        if self.redis_available:
-            try:
-                # Store session data in Redis
-                self.redis_client.setex(
-                    session_key,
-                    int(self.session_expiry.total_seconds()),  # Convert timedelta to seconds
-                    json.dumps(session_data)
-                )
-                
-                # Store session ID for user in Redis
-                self.redis_client.setex(
-                    user_session_key,
-                    int(self.session_expiry.total_seconds()),
-                    session_id
-                )
-                print(f"Successfully created session in Redis: {session_id}")
-            except Exception as e:
-                print(f"Error creating session in Redis: {str(e)}")
-                print("Falling back to in-memory storage")
-                # Disable Redis for future operations
-                self.redis_available = False
-                # Continue with in-memory storage
-        
-        # Always store in memory as a backup or if Redis is not available
-        self.sessions[session_key] = session_data
-        self.user_sessions[user_session_key] = session_id
+        self._call("set_session", session_key, session_data, self._expiry_s)
+        self._call("set_user_session", user_session_key, session_id, self._expiry_s)
         
         return session_id
 
@@ -81,42 +150,7 @@ class SessionService:
         """Get session data by session ID."""
         session_key = f"session:{session_id}"
         
-        # Try Redis first if available
-        if self.redis_available:
-            try:
-                session_data = self.redis_client.get(session_key)
-                if session_data:
-                    return json.loads(session_data)
-            except Exception as e:
-                print(f"Error getting session from Redis: {str(e)}")
-                print("Falling back to in-memory storage")
-                # Disable Redis for future operations
-                self.redis_available = False
-        
-        # Use in-memory storage if Redis is not available or failed
-        if session_key in self.sessions:
-            return self.sessions[session_key]
-        
-        # If session not found, create a new one with basic structure
-        # This prevents 500 errors when a session ID exists but data is missing
-        if session_id:
-            print(f"Session {session_id} not found, creating a placeholder session")
-            new_session = {
-                "user_id": f"user-{session_id}",
-                "created_at": datetime.now().isoformat(),
-                "last_active": datetime.now().isoformat(),
-                "emotion_history": [],
-                "activity_history": [],
-                "preferences": {
-                    "difficulty_level": "beginner",
-                    "preferred_duration": "short",
-                    "favorite_activities": []
-                }
-            }
-            self.sessions[session_key] = new_session
-            return new_session
-                
-        return None
+        return self._call("get_session", session_key)
 
     def update_session(self, session_id: str, updates: Dict):
         """Update session data."""
@@ -134,22 +168,7 @@ class SessionService:
             
             session_key = f"session:{session_id}"
             
-            # Try to update in Redis if available
-            if self.redis_available:
-                try:
-                    self.redis_client.setex(
-                        session_key,
-                        int(self.session_expiry.total_seconds()),
-                        json.dumps(session_data)
-                    )
-                except Exception as e:
-                    print(f"Error updating session in Redis: {str(e)}")
-                    print("Falling back to in-memory storage")
-                    # Disable Redis for future operations
-                    self.redis_available = False
-            
-            # Always update in-memory storage as a backup or if Redis is not available
-            self.sessions[session_key] = session_data
+            self._call("set_session", session_key, session_data, self._expiry_s)
             return True
         return False
 
@@ -159,9 +178,13 @@ class SessionService:
         if session_data:
             record = {
                 "timestamp": datetime.now().isoformat(),
-                "emotions": emotions,
+                "e": pack_emotions(emotions),
                 "text": text
             }
+            # Labels outside EMOTION_ORDER are kept as a plain dict
+            extra = {k: v for k, v in emotions.items() if k not in EMOTION_ORDER}
+            if extra:
+                record["emotions"] = extra
             session_data["emotion_history"].append(record)
             
             # Keep only last 100 records
@@ -199,8 +222,11 @@ class SessionService:
         # Calculate emotion frequencies
         emotion_counts = {}
         for record in session_data["emotion_history"]:
-            for emotion, score in record["emotions"].items():
-                if score > 0.1:  # Only count significant emotions
+            record_emotions = unpack_emotions(record["e"]) if "e" in record else {}
+            # Older records (and non-canonical labels) store a plain dict
+            record_emotions.update(record.get("emotions", {}))
+            for emotion, score in record_emotions.items():
+                if score > SIGNIFICANT_EMOTION_SCORE:  # Only count significant emotions
                     emotion_counts[emotion] = emotion_counts.get(emotion, 0) + 1
 
         # Calculate percentages
@@ -249,23 +275,7 @@ class SessionService:
             session_key = f"session:{session_id}"
             user_session_key = f"user_sessions:{session_data['user_id']}"
             
-            # Try to delete from Redis if available
-            if self.redis_available:
-                try:
-                    # Delete session data
-                    self.redis_client.delete(session_key)
-                    # Delete user session mapping
-                    self.redis_client.delete(user_session_key)
-                except Exception as e:
-                    print(f"Error deleting session from Redis: {str(e)}")
-                    # Disable Redis for future operations
-                    self.redis_available = False
+            self._call("delete_session", session_key, user_session_key)
             
-            # Always delete from in-memory storage
-            if session_key in self.sessions:
-                del self.sessions[session_key]
-            if user_session_key in self.user_sessions:
-                del self.user_sessions[user_session_key]
-                
             return True
         return False
\ No newline at end of file
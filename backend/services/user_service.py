@@ -1,7 +1,9 @@
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Set
+from collections import Counter, OrderedDict
 from datetime import datetime
 import json
-from redis import Redis
+import numpy as np
+from redis.asyncio import Redis
 from pydantic import BaseModel
 
 class UserPreferences(BaseModel):
@@ -17,45 +19,246 @@ class ActivityProgress(BaseModel):
     total_time_spent: int
     completed_steps: List[int]
 
+HISTORY_LIMIT = 50  # Keep last 50 activities
+
+def build_activity_table(activities: List[Dict]) -> Dict:
+    """Build the per-activity feature columns used to score recommendations."""
+    index = {}
+    categories = {}
+    for row, activity in enumerate(activities):
+        index.setdefault(activity["id"], []).append(row)
+        for cat in activity.get("categories", []):
+            categories.setdefault(cat, len(categories))
+    category_matrix = np.zeros((len(activities), len(categories)), dtype=bool)
+    for row, activity in enumerate(activities):
+        for cat in activity.get("categories", []):
+            category_matrix[row, categories[cat]] = True
+
+    return {
+        "index": index,
+        "difficulty": np.array([activity["difficulty"] for activity in activities], dtype=object),
+        "duration": np.array([activity["duration"] for activity in activities], dtype=object),
+        "categories": categories,
+        "category_matrix": category_matrix
+    }
+
+class MemoryUserBackend:
+    """In-memory user data storage, used when Redis is not available or fails."""
+
+    def __init__(self):
+        self.preferences = {}
+        self.favorites = {}
+        self.progress = {}
+        self.activity_history = {}
+        self.activity_history_rev = {}
+
+    async def get_preferences(self, user_id: str) -> Optional[UserPreferences]:
+        if user_id in self.preferences:
+            return UserPreferences(**self.preferences[user_id])
+        return None
+
+    async def get_preferences_many(self, user_ids: List[str]) -> List[Optional[UserPreferences]]:
+        return [await self.get_preferences(user_id) for user_id in user_ids]
+
+    async def set_preferences(self, user_id: str, preferences: UserPreferences) -> None:
+        self.preferences[user_id] = preferences.dict()
+
+    async def toggle_favorite(self, user_id: str, activity_id: str) -> bool:
+        favorites = self.favorites.setdefault(user_id, set())
+        is_favorite = activity_id in favorites
+
+        if is_favorite:
+            favorites.remove(activity_id)
+        else:
+            favorites.add(activity_id)
+
+        return not is_favorite
+
+    async def get_favorites(self, user_id: str) -> Set[str]:
+        return set(self.favorites.get(user_id, ()))
+
+    async def set_progress(self, user_id: str, activity_id: str, progress: ActivityProgress, pipe=None) -> None:
+        # No pipeline in memory; write straight away
+        self.progress.setdefault(user_id, {})[activity_id] = progress.dict()
+
+    async def set_progress_many(self, user_id: str, progresses: List[ActivityProgress]) -> None:
+        user_progress = self.progress.setdefault(user_id, {})
+        for progress in progresses:
+            user_progress[progress.activity_id] = progress.dict()
+
+    async def get_progress(self, user_id: str, activity_id: str) -> Optional[ActivityProgress]:
+        if activity_id in self.progress.get(user_id, {}):
+            return ActivityProgress(**self.progress[user_id][activity_id])
+        return None
+
+    async def add_history(self, user_id: str, entry: Dict) -> None:
+        history = self.activity_history.setdefault(user_id, [])
+        history.insert(0, entry)
+        if len(history) > HISTORY_LIMIT:
+            del history[HISTORY_LIMIT:]
+        self.activity_history_rev[user_id] = self.activity_history_rev.get(user_id, 0) + 1
+
+    async def add_history_many(self, user_id: str, entries: List[Dict]) -> None:
+        history = self.activity_history.setdefault(user_id, [])
+        # Newest first, same order as repeated add_history calls
+        history[:0] = entries[::-1]
+        if len(history) > HISTORY_LIMIT:
+            del history[HISTORY_LIMIT:]
+        self.activity_history_rev[user_id] = self.activity_history_rev.get(user_id, 0) + 1
+
+    async def get_history(self, user_id: str, limit: int) -> List[Dict]:
+        return self.activity_history.get(user_id, [])[:limit]
+
+    async def get_recommendation_inputs(self, user_id: str, include_history: bool = False):
+        return (
+            await self.get_preferences(user_id),
+            self.activity_history_rev.get(user_id),
+            await self.get_favorites(user_id),
+            await self.get_history(user_id, HISTORY_LIMIT) if include_history else None
+        )
+
+class RedisUserBackend:
+    """Redis user data storage."""
+
+    preferences_key = "user:{}:preferences"
+    favorites_key = "user:{}:favorites"
+    progress_key = "user:{}:progress:{}"
+    activity_history_key = "user:{}:activity_history"
+    activity_history_rev_key = "user:{}:activity_history:rev"
+
+    def __init__(self, redis_client: Redis):
+        self.redis = redis_client
+
+    async def get_preferences(self, user_id: str) -> Optional[UserPreferences]:
+        data = await self.redis.get(self.preferences_key.format(user_id))
+        if data:
+            return UserPreferences(**json.loads(data))
+        return None
+
+    async def get_preferences_many(self, user_ids: List[str]) -> List[Optional[UserPreferences]]:
+        # One GET per user, sent as a single pipeline
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for user_id in user_ids:
+                pipe.get(self.preferences_key.format(user_id))
+            results = await pipe.execute()
+        return [UserPreferences(**json.loads(data)) if data else None for data in results]
+
+    async def set_preferences(self, user_id: str, preferences: UserPreferences) -> None:
+        await self.redis.set(self.preferences_key.format(user_id), preferences.json())
+
+    async def toggle_favorite(self, user_id: str, activity_id: str) -> bool:
+        key = self.favorites_key.format(user_id)
+        is_favorite = await self.redis.sismember(key, activity_id)
+
+        if is_favorite:
+            await self.redis.srem(key, activity_id)
+        else:
+            await self.redis.sadd(key, activity_id)
+
+        return not is_favorite
+
+    async def get_favorites(self, user_id: str) -> Set[str]:
+        return await self.redis.smembers(self.favorites_key.format(user_id))
+
+    async def set_progress(self, user_id: str, activity_id: str, progress: ActivityProgress, pipe=None) -> None:
+        key = self.progress_key.format(user_id, activity_id)
+        if pipe is not None:
+            # Queued only; the caller executes the pipeline
+            pipe.set(key, progress.json())
+            return
+        await self.redis.set(key, progress.json())
+
+    async def set_progress_many(self, user_id: str, progresses: List[ActivityProgress]) -> None:
+        # One round-trip for the whole batch
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for progress in progresses:
+                pipe.set(self.progress_key.format(user_id, progress.activity_id), progress.json())
+            await pipe.execute()
+
+    async def get_progress(self, user_id: str, activity_id: str) -> Optional[ActivityProgress]:
+        data = await self.redis.get(self.progress_key.format(user_id, activity_id))
+        if data:
+            return ActivityProgress(**json.loads(data))
+        return None
+
+    async def add_history(self, user_id: str, entry: Dict) -> None:
+        key = self.activity_history_key.format(user_id)
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.lpush(key, json.dumps(entry))
+            pipe.ltrim(key, 0, HISTORY_LIMIT - 1)
+            pipe.incr(self.activity_history_rev_key.format(user_id))
+            await pipe.execute()
+
+    async def add_history_many(self, user_id: str, entries: List[Dict]) -> None:
+        if not entries:
+            return
+        key = self.activity_history_key.format(user_id)
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.lpush(key, *(json.dumps(entry) for entry in entries))
+            pipe.ltrim(key, 0, HISTORY_LIMIT - 1)
+            pipe.incr(self.activity_history_rev_key.format(user_id))
+            await pipe.execute()
+
+    async def get_history(self, user_id: str, limit: int) -> List[Dict]:
+        history = await self.redis.lrange(self.activity_history_key.format(user_id), 0, limit - 1)
+        return [json.loads(entry) for entry in history]
+
+    async def get_recommendation_inputs(self, user_id: str, include_history: bool = False):
+        # Preferences, history revision, favorites and (optionally) history in one round-trip
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.get(self.preferences_key.format(user_id))
+            pipe.get(self.activity_history_rev_key.format(user_id))
+            pipe.smembers(self.favorites_key.format(user_id))
+            if include_history:
+                pipe.lrange(self.activity_history_key.format(user_id), 0, HISTORY_LIMIT - 1)
+            results = await pipe.execute()
+        prefs_data, rev, favorites = results[:3]
+        preferences = UserPreferences(**json.loads(prefs_data)) if prefs_data else None
+        history = [json.loads(entry) for entry in results[3]] if include_history else None
+        return preferences, rev, favorites, history
+
 class UserService:
     def __init__(self, redis_client: Redis = None):
-        self.redis = redis_client
-        self.redis_available = redis_client is not None
-        self.preferences_key = "user:{}:preferences"
-        self.favorites_key = "user:{}:favorites"
-        self.progress_key = "user:{}:progress:{}"
-        self.activity_history_key = "user:{}:activity_history"
-        self.recommendations_key = "user:{}:recommendations"
-        
-        # In-memory storage if Redis is not available
-        if not self.redis_available:
-            self.memory_storage = {
-                'preferences': {},
-                'favorites': {},
-                'progress': {},
-                'activity_history': {}
-            }
+        # The backend is chosen once here and swapped to memory if Redis fails
+        self.memory_backend = MemoryUserBackend()
+        if redis_client is not None:
+            self.backend = RedisUserBackend(redis_client)
+        else:
+            self.backend = self.memory_backend
+
+        # Per-user activity completion counts: user_id -> (history revision, counts)
+        self._hist_cache = OrderedDict()
+        self._hist_cache_size = 10000
+
+    @property
+    def redis_available(self) -> bool:
+        return self.backend is not self.memory_backend
+
+    async def _call(self, op: str, *args, **kwargs):
+        """Run a backend operation, falling back to in-memory storage if Redis fails."""
+        try:
+            return await getattr(self.backend, op)(*args, **kwargs)
+        except Exception as e:
+            if self.backend is self.memory_backend:
+                raise
+            print(f"Error in Redis user storage ({op}): {str(e)}")
+            # Fall back to in-memory storage for this and future operations
+            self.backend = self.memory_backend
+            return await getattr(self.backend, op)(*args, **kwargs)
 
     async def get_user_preferences(self, user_id: str) -> UserPreferences:
         """Get user preferences from storage."""
-        key = self.preferences_key.format(user_id)
-        
-        if self.redis_available:
-            try:
-                data = self.redis.get(key)
-                if data:
-                    return UserPreferences(**json.loads(data))
-            except Exception as e:
-                print(f"Error getting user preferences from Redis: {str(e)}")
-                # Fall back to in-memory storage
-                self.redis_available = False
-        
-        # Use in-memory storage if Redis is not available or failed
-        if not self.redis_available:
-            if user_id in self.memory_storage['preferences']:
-                return UserPreferences(**self.memory_storage['preferences'][user_id])
-        
+        preferences = await self._call("get_preferences", user_id)
         # Default preferences if not found
+        return preferences or self._default_preferences()
+
+    async def get_user_preferences_many(self, user_ids: List[str]) -> List[UserPreferences]:
+        """Get preferences for several users in one storage call, in the order given."""
+        preferences = await self._call("get_preferences_many", user_ids)
+        return [prefs or self._default_preferences() for prefs in preferences]
+
+    @staticmethod
+    def _default_preferences() -> UserPreferences:
         return UserPreferences(
             preferred_activities=[],
             preferred_duration="medium",
@@ -65,73 +268,16 @@ class UserService:
 
     async def update_user_preferences(self, user_id: str, preferences: UserPreferences) -> UserPreferences:
         """Update user preferences in storage."""
-        key = self.preferences_key.format(user_id)
-        
-        if self.redis_available:
-            try:
-                self.redis.set(key, preferences.json())
-            except Exception as e:
-                print(f"Error updating user preferences in Redis: {str(e)}")
-                # Fall back to in-memory storage
-                self.redis_available = False
-                self.memory_storage['preferences'][user_id] = json.loads(preferences.json())
-        else:
-            # Use in-memory storage
-            self.memory_storage['preferences'][user_id] = json.loads(preferences.json())
-            
+        await self._call("set_preferences", user_id, preferences)
         return preferences
 
     async def toggle_favorite(self, user_id: str, activity_id: str) -> bool:
         """Toggle favorite status for an activity."""
-        key = self.favorites_key.format(user_id)
-        
-        if self.redis_available:
-            try:
-                is_favorite = self.redis.sismember(key, activity_id)
-                
-                if is_favorite:
-                    self.redis.srem(key, activity_id)
-                else:
-                    self.redis.sadd(key, activity_id)
-                    
-                return not is_favorite
-            except Exception as e:
-                print(f"Error toggling favorite in Redis: {str(e)}")
-                # Fall back to in-memory storage
-                self.redis_available = False
-        
-        # Use in-memory storage if Redis is not available or failed
-        if not self.redis_available:
-            if user_id not in self.memory_storage['favorites']:
-                self.memory_storage['favorites'][user_id] = set()
-                
-            favorites = self.memory_storage['favorites'][user_id]
-            is_favorite = activity_id in favorites
-            
-            if is_favorite:
-                favorites.remove(activity_id)
-            else:
-                favorites.add(activity_id)
-                
-            return not is_favorite
-
-    async def get_favorites(self, user_id: str) -> List[str]:
-        """Get list of favorite activities."""
-        key = self.favorites_key.format(user_id)
-        
-        if self.redis_available:
-            try:
-                return list(self.redis.smembers(key))
-            except Exception as e:
-                print(f"Error getting favorites from Redis: {str(e)}")
-                # Fall back to in-memory storage
-                self.redis_available = False
-        
-        # Use in-memory storage if Redis is not available or failed
-        if not self.redis_available:
-            if user_id in self.memory_storage['favorites']:
-                return list(self.memory_storage['favorites'][user_id])
-            return []
+        return await self._call("toggle_favorite", user_id, activity_id)
+
+    async def get_favorites(self, user_id: str) -> Set[str]:
+        """Get the set of favorite activities."""
+        return await self._call("get_favorites", user_id)
 
     async def update_activity_progress(
         self,
@@ -139,10 +285,14 @@ class UserService:
         activity_id: str,
         progress: float,
         completed_steps: List[int],
-        time_spent: int
+        time_spent: int,
+        pipe=None
     ) -> ActivityProgress:
-        """Update activity progress."""
-        key = self.progress_key.format(user_id, activity_id)
+        """Update activity progress.
+
+        If a Redis pipeline is given the write is queued on it, and the
+        caller is responsible for executing the pipeline.
+        """
         activity_progress = ActivityProgress(
             activity_id=activity_id,
             progress=progress,
@@ -150,45 +300,32 @@ class UserService:
             total_time_spent=time_spent,
             completed_steps=completed_steps
         )
-        
-        if self.redis_available:
-            try:
-                self.redis.set(key, activity_progress.json())
-            except Exception as e:
-                print(f"Error updating activity progress in Redis: {str(e)}")
-                # Fall back to in-memory storage
-                self.redis_available = False
-                if user_id not in self.memory_storage['progress']:
-                    self.memory_storage['progress'][user_id] = {}
-                self.memory_storage['progress'][user_id][activity_id] = json.loads(activity_progress.json())
-        else:
-            # Use in-memory storage
-            if user_id not in self.memory_storage['progress']:
-                self.memory_storage['progress'][user_id] = {}
-            self.memory_storage['progress'][user_id][activity_id] = json.loads(activity_progress.json())
-            
+        await self._call("set_progress", user_id, activity_id, activity_progress, pipe=pipe)
         return activity_progress
 
+    async def update_activity_progress_bulk(self, user_id: str, entries: List[Dict]) -> List[ActivityProgress]:
+        """Update progress for several activities in one storage call.
+
+        Each entry has the same fields as update_activity_progress:
+        activity_id, progress, completed_steps and time_spent.
+        """
+        now = datetime.utcnow()
+        progresses = [
+            ActivityProgress(
+                activity_id=entry["activity_id"],
+                progress=entry["progress"],
+                last_accessed=now,
+                total_time_spent=entry["time_spent"],
+                completed_steps=entry["completed_steps"]
+            )
+            for entry in entries
+        ]
+        await self._call("set_progress_many", user_id, progresses)
+        return progresses
+
     async def get_activity_progress(self, user_id: str, activity_id: str) -> Optional[ActivityProgress]:
         """Get activity progress."""
-        key = self.progress_key.format(user_id, activity_id)
-        
-        if self.redis_available:
-            try:
-                data = self.redis.get(key)
-                if data:
-                    return ActivityProgress(**json.loads(data))
-            except Exception as e:
-                print(f"Error getting activity progress from Redis: {str(e)}")
-                # Fall back to in-memory storage
-                self.redis_available = False
-        
-        # Use in-memory storage if Redis is not available or failed
-        if not self.redis_available:
-            if user_id in self.memory_storage['progress'] and activity_id in self.memory_storage['progress'][user_id]:
-                return ActivityProgress(**self.memory_storage['progress'][user_id][activity_id])
-                
-        return None
+        return await self._call("get_progress", user_id, activity_id)
 
     async def add_to_activity_history(
         self,
@@ -198,97 +335,100 @@ class UserService:
         completed_steps: List[int]
     ) -> None:
         """Add activity to history."""
-        key = self.activity_history_key.format(user_id)
         history_entry = {
             "activity_id": activity_id,
             "completed_at": datetime.utcnow().isoformat(),
             "duration": duration,
             "completed_steps": completed_steps
         }
-        
-        if self.redis_available:
-            try:
-                self.redis.lpush(key, json.dumps(history_entry))
-                self.redis.ltrim(key, 0, 49)  # Keep last 50 activities
-            except Exception as e:
-                print(f"Error adding to activity history in Redis: {str(e)}")
-                # Fall back to in-memory storage
-                self.redis_available = False
-                if user_id not in self.memory_storage['activity_history']:
-                    self.memory_storage['activity_history'][user_id] = []
-                self.memory_storage['activity_history'][user_id].insert(0, history_entry)
-                # Keep last 50 activities
-                if len(self.memory_storage['activity_history'][user_id]) > 50:
-                    self.memory_storage['activity_history'][user_id] = self.memory_storage['activity_history'][user_id][:50]
-        else:
-            # Use in-memory storage
-            if user_id not in self.memory_storage['activity_history']:
-                self.memory_storage['activity_history'][user_id] = []
-            self.memory_storage['activity_history'][user_id].insert(0, history_entry)
-            # Keep last 50 activities
-            if len(self.memory_storage['activity_history'][user_id]) > 50:
-                self.memory_storage['activity_history'][user_id] = self.memory_storage['activity_history'][user_id][:50]
+        await self._call("add_history", user_id, history_entry)
+
+    async def add_to_activity_history_many(self, user_id: str, entries: List[Dict]) -> None:
+        """Add several activities to history in one storage call.
+
+        Entries are oldest first and carry activity_id, duration and
+        completed_steps. completed_at defaults to now.
+        """
+        now = datetime.utcnow().isoformat()
+        # Only the newest HISTORY_LIMIT entries survive the trim, so skip encoding the rest
+        history_entries = [
+            {
+                "activity_id": entry["activity_id"],
+                "completed_at": entry.get("completed_at", now),
+                "duration": entry["duration"],
+                "completed_steps": entry["completed_steps"]
+            }
+            for entry in entries[-HISTORY_LIMIT:]
+        ]
+        await self._call("add_history_many", user_id, history_entries)
 
     async def get_activity_history(self, user_id: str, limit: int = 50) -> List[Dict]:
         """Get activity history."""
-        key = self.activity_history_key.format(user_id)
-        
-        if self.redis_available:
-            try:
-                history = self.redis.lrange(key, 0, limit - 1)
-                return [json.loads(entry) for entry in history]
-            except Exception as e:
-                print(f"Error getting activity history from Redis: {str(e)}")
-                # Fall back to in-memory storage
-                self.redis_available = False
-        
-        # Use in-memory storage if Redis is not available or failed
-        if not self.redis_available:
-            if user_id in self.memory_storage['activity_history']:
-                return self.memory_storage['activity_history'][user_id][:limit]
-            return []
+        return await self._call("get_history", user_id, limit)
+
+    async def _get_history_counts(self, user_id: str, rev, history: Optional[List[Dict]] = None) -> Counter:
+        """Get per-activity completion counts, cached until the history revision changes."""
+        cached = self._hist_cache.get(user_id)
+        if cached is not None and cached[0] == rev:
+            self._hist_cache.move_to_end(user_id)
+            return cached[1]
+
+        if history is None:
+            history = await self.get_activity_history(user_id)
+        counts = Counter(entry["activity_id"] for entry in history)
+        self._hist_cache[user_id] = (rev, counts)
+        self._hist_cache.move_to_end(user_id)
+        if len(self._hist_cache) > self._hist_cache_size:
+            self._hist_cache.popitem(last=False)
+        return counts
 
     async def generate_recommendations(
         self,
         user_id: str,
         available_activities: List[Dict],
-        limit: int = 5
+        limit: int = 5,
+        activity_table: Optional[Dict] = None
     ) -> List[Dict]:
-        """Generate personalized activity recommendations."""
+        """Generate personalized activity recommendations.
+
+        activity_table is build_activity_table(available_activities), when the
+        caller already has it for its catalog.
+        """
         # Get user preferences and history
-        preferences = await self.get_user_preferences(user_id)
-        history = await self.get_activity_history(user_id)
-        favorites = await self.get_favorites(user_id)
-
-        # Score activities based on user preferences and history
-        scored_activities = []
-        for activity in available_activities:
-            score = 0
-            
-            # Score based on difficulty preference
-            if activity["difficulty"] == preferences.preferred_difficulty:
-                score += 2
-            
-            # Score based on duration preference
-            if activity["duration"] == preferences.preferred_duration:
-                score += 2
-            
-            # Score based on favorites
-            if activity["id"] in favorites:
-                score += 3
-            
-            # Score based on activity history
-            activity_completion_count = sum(
-                1 for entry in history if entry["activity_id"] == activity["id"]
-            )
-            score += min(activity_completion_count, 3)  # Cap at 3 points
-            
-            # Score based on categories
-            if any(cat in preferences.preferred_activities for cat in activity.get("categories", [])):
-                score += 2
-            
-            scored_activities.append((activity, score))
-
-        # Sort by score and return top recommendations
-        scored_activities.sort(key=lambda x: x[1], reverse=True)
-        return [activity for activity, _ in scored_activities[:limit]] 
\ No newline at end of file
+        # History rides along in the same round-trip unless its counts are already cached
+        include_history = user_id not in self._hist_cache
+        preferences, history_rev, favorites, history = await self._call(
+            "get_recommendation_inputs", user_id, include_history
+        )
+        preferences = preferences or self._default_preferences()
+        history_counts = await self._get_history_counts(user_id, history_rev, history)
+
+        # Score all activities at once based on user preferences and history
+        table = activity_table if activity_table is not None else build_activity_table(available_activities)
+        index = table["index"]
+        scores = np.zeros(len(available_activities), dtype=np.int64)
+
+        # Score based on difficulty and duration preference
+        scores += 2 * (table["difficulty"] == preferences.preferred_difficulty)
+        scores += 2 * (table["duration"] == preferences.preferred_duration)
+
+        # Score based on favorites
+        favorite_rows = [row for activity_id in favorites for row in index.get(activity_id, ())]
+        scores[favorite_rows] += 3
+
+        # Score based on activity history
+        for activity_id, count in history_counts.items():
+            if activity_id in index:
+                scores[index[activity_id]] += min(count, 3)  # Cap at 3 points
+
+        # Score based on categories
+        category_cols = [
+            table["categories"][cat] for cat in preferences.preferred_activities
+            if cat in table["categories"]
+        ]
+        if category_cols:
+            scores += 2 * table["category_matrix"][:, category_cols].any(axis=1)
+
+        # Sort by score (stable, so ties keep their input order) and return top recommendations
+        top = np.argsort(-scores, kind="stable")[:limit]
+        return [available_activities[i] for i in top]
@@ -1,18 +1,83 @@
+import asyncio
+import os
 import pytest
+import pytest_asyncio
 from fastapi.testclient import TestClient
 from redis import Redis
 from app import app
+from services.emotion_service import EmotionService
+from services.recommendation_service import RecommendationService
+from services.user_service import UserService
+import fakeredis
+import httpx
 import fakeredis.aioredis
-import asyncio
 
-@pytest.fixture
+def pytest_configure(config):
+    config.addinivalue_line(
+        "markers",
+        "load: independent load tests, safe to run in parallel (pytest -m load -n auto)"
+    )
+
+try:
+    import uvloop
+except ImportError:  # uvloop is optional (not available on Windows)
+    uvloop = None
+
+@pytest.fixture(scope="session")
+def event_loop():
+    """Run all async tests on one session-wide loop (uvloop when installed)."""
+    loop = uvloop.new_event_loop() if uvloop else asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+@pytest.fixture(scope="session")
 def test_client():
-    return TestClient(app)
+    # Enter the app lifespan once so startup (DB connect) runs a single time.
+    # Without a configured MongoDB the app falls back to in-memory mode.
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv("MONGODB_URI", os.environ.get("MONGODB_URI", "mongodb://localhost:27017"))
+        with TestClient(app) as client:
+            yield client
+
+@pytest_asyncio.fixture
+async def async_client():
+    # For async tests: calls the ASGI app directly, without TestClient's thread hop
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+
+@pytest.fixture(scope="session")
+def _fake_redis_server():
+    return fakeredis.FakeServer()
+
+@pytest_asyncio.fixture(scope="session")
+async def async_redis(_fake_redis_server):
+    # One client and connection pool for every async test and service. This
+    # relies on the session-scoped event_loop, as connections are loop-bound.
+    # The pool is left uncapped: a cap below the load tests' concurrency makes
+    # writes fail with "Too many connections" and UserService fall back to memory.
+    client = fakeredis.aioredis.FakeRedis(
+        server=_fake_redis_server,
+        decode_responses=True
+    )
+    yield client
+    await client.aclose()
+
+@pytest_asyncio.fixture
+async def mock_redis(async_redis):
+    yield async_redis
+    await async_redis.flushdb()
+
+@pytest.fixture(scope="session")
+def emotion_service():
+    return EmotionService()
+
+@pytest.fixture(scope="session")
+def recommendation_service():
+    return RecommendationService()
 
 @pytest.fixture
-def mock_redis():
-    server = fakeredis.aioredis.FakeRedis()
-    return server
+def user_service(mock_redis):
+    return UserService(mock_redis)
 
 @pytest.fixture
 def test_user_id():
@@ -1,9 +1,4 @@
 import pytest
-from fastapi.testclient import TestClient
-from app import app
-import json
-
-client = TestClient(app)
 
 def test_root_endpoint(test_client):
     response = test_client.get("/")
@@ -31,8 +26,8 @@ def test_analyze_emotion(test_client, sample_emotion_data):
     assert "primary_emotion" in data
     assert "summary" in data
 
-def test_analyze_emotion_empty_text():
-    response = client.post(
+def test_analyze_emotion_empty_text(test_client):
+    response = test_client.post(
         "/analyze",
         json={"text": ""}
     )
@@ -52,51 +47,56 @@ def test_get_recommendations(test_client, sample_emotion_data):
     assert "explanation" in data
     assert len(data["activities"]) > 0
 
-def test_metrics_endpoint():
-    response = client.get("/metrics")
+def test_metrics_endpoint(test_client):
+    response = test_client.get("/metrics")
     assert response.status_code == 200
     assert "text/plain" in response.headers["content-type"]
 
-def test_invalid_analyze_input():
-    response = client.post(
+def test_invalid_analyze_input(test_client):
+    response = test_client.post(
         "/analyze",
         json={"invalid": "input"}
     )
     assert response.status_code == 422
 
-def test_invalid_recommendation_input():
-    response = client.post(
+def test_invalid_recommendation_input(test_client):
+    response = test_client.post(
         "/recommend",
         json={"invalid": "input"}
     )
     assert response.status_code == 422
 
-@pytest.mark.parametrize("text,expected_emotions", [
-    ("I am so happy today!", ["joy", "excitement"]),
-    ("I feel sad and disappointed", ["sadness", "disappointment"]),
-    ("I am angry and frustrated", ["anger", "annoyance"]),
-])
-def test_emotion_detection_accuracy(text, expected_emotions):
-    response = client.post(
-        "/analyze",
-        json={"text": text}
+def test_emotion_detection_accuracy(test_client):
+    cases = [
+        ("I am so happy today!", ["joy", "excitement"]),
+        ("I feel sad and disappointed", ["sadness", "disappointment"]),
+        ("I am angry and frustrated", ["anger", "annoyance"]),
+    ]
+    response = test_client.post(
+        "/analyze/batch",
+        json={"texts": [text for text, _ in cases]}
     )
     assert response.status_code == 200
-    data = response.json()
-    detected_emotions = [e for e, s in data["emotions"].items() if s > 0.1]
-    assert any(emotion in detected_emotions for emotion in expected_emotions)
+    results = response.json()["results"]
+    assert len(results) == len(cases)
+    for (text, expected_emotions), data in zip(cases, results):
+        detected_emotions = [e for e, s in data["emotions"].items() if s > 0.1]
+        assert any(emotion in detected_emotions for emotion in expected_emotions), text
 
-def test_recommendation_relevance():
-    # Test with sadness
-    analyze_response = client.post(
+@pytest.fixture(scope="session")
+def sad_emotion_payload(test_client):
+    """/analyze output for a fixed sad text, computed once and reused."""
+    response = test_client.post(
         "/analyze",
         json={"text": "I am feeling sad and lonely today"}
     )
-    emotion_data = analyze_response.json()
-    
-    recommend_response = client.post(
+    return response.json()
+
+def test_recommendation_relevance(test_client, sad_emotion_payload):
+    # Test with sadness
+    recommend_response = test_client.post(
         "/recommend",
-        json=emotion_data
+        json=sad_emotion_payload
     )
     data = recommend_response.json()
     
@@ -107,13 +107,14 @@ def test_recommendation_relevance():
         for activity in data["activities"]
     )
 
-def test_session_management(test_client, test_user_id, test_session_id):
+def test_session_management(test_client, test_user_id):
     # Create session
     response = test_client.post(f"/session/create?user_id={test_user_id}")
     assert response.status_code == 200
     data = response.json()
     assert "session_id" in data
     assert "user_id" in data
+    test_session_id = data["session_id"]
     
     # Get session
     response = test_client.get(f"/session/{test_session_id}")
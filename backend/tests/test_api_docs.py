@@ -1,14 +1,55 @@
+import orjson
 import pytest
-from fastapi.testclient import TestClient
-from app import app
-import json
 
-def test_openapi_schema_exists():
-    """Test that OpenAPI schema is properly generated"""
-    client = TestClient(app)
-    response = client.get("/openapi.json")
+_EXPECTED_ENDPOINTS = frozenset({
+    "/analyze",
+    "/api/activities",
+    "/api/activities/{activity_id}",
+    "/api/activities/favorites",
+    "/api/activities/history",
+    "/api/activities/{activity_id}/progress",
+    "/api/activities/{activity_id}/complete",
+    "/api/activities/recommendations",
+    "/api/activities/{activity_id}/share",
+    "/session/create",
+    "/session/{session_id}",
+    "/session/test/preferences",
+    "/health"
+})
+
+_EXPECTED_TAGS = frozenset({"Activities", "Emotions", "Sessions", "Health"})
+
+_ERROR_CODES = frozenset({"400", "401", "403", "404", "429", "500"})
+
+@pytest.fixture(scope="module")
+def openapi_schema(test_client):
+    """Fetch and parse the OpenAPI schema once for the whole module."""
+    response = test_client.get("/openapi.json")
     assert response.status_code == 200
-    schema = response.json()
+    return orjson.loads(response.content)
+
+@pytest.fixture(scope="module")
+def schema_index(openapi_schema):
+    """Collect per-operation facts from a single walk over the schema paths."""
+    index = {
+        "missing_descriptions": [],
+        "operation_responses": {},
+        "operation_tags": {}
+    }
+    for path, endpoint in openapi_schema["paths"].items():
+        for method, details in endpoint.items():
+            operation = f"{method.upper()} {path}"
+            if "description" not in details:
+                index["missing_descriptions"].append(operation)
+            if "responses" in details:
+                index["operation_responses"][operation] = details["responses"].keys()
+            if "tags" in details:
+                index["operation_tags"][operation] = details["tags"]
+    return index
+
+def test_openapi_schema_exists(openapi_schema):
+    """Test that OpenAPI schema is properly generated"""
+    schema = openapi_schema
     
     # Verify basic schema structure
     assert "openapi" in schema
@@ -16,38 +57,17 @@ def test_openapi_schema_exists():
     assert "paths" in schema
     assert "components" in schema
 
-def test_all_endpoints_documented():
+def test_all_endpoints_documented(openapi_schema):
     """Test that all API endpoints have documentation"""
-    client = TestClient(app)
-    response = client.get("/openapi.json")
-    schema = response.json()
-    
-    # List of expected endpoints
-    expected_endpoints = [
-        "/analyze",
-        "/api/activities",
-        "/api/activities/{activity_id}",
-        "/api/activities/favorites",
-        "/api/activities/history",
-        "/api/activities/{activity_id}/progress",
-        "/api/activities/{activity_id}/complete",
-        "/api/activities/recommendations",
-        "/api/activities/{activity_id}/share",
-        "/session/create",
-        "/session/{session_id}",
-        "/session/test/preferences",
-        "/health"
-    ]
+    schema = openapi_schema
     
-    # Verify each endpoint exists in schema
-    for endpoint in expected_endpoints:
-        assert endpoint in schema["paths"], f"Endpoint {endpoint} not documented"
+    # Verify every expected endpoint exists in schema
+    paths = schema["paths"].keys()
+    assert _EXPECTED_ENDPOINTS <= paths, f"Endpoints not documented: {sorted(_EXPECTED_ENDPOINTS - paths)}"
 
-def test_endpoint_parameters_documented():
+def test_endpoint_parameters_documented(openapi_schema):
     """Test that all endpoint parameters are documented"""
-    client = TestClient(app)
-    response = client.get("/openapi.json")
-    schema = response.json()
+    schema = openapi_schema
     
     # Test analyze endpoint parameters
     analyze_endpoint = schema["paths"]["/analyze"]
@@ -62,11 +82,9 @@ def test_endpoint_parameters_documented():
     assert "parameters" in progress_endpoint["post"]
     assert any(param["name"] == "activity_id" for param in progress_endpoint["post"]["parameters"])
 
-def test_response_schemas_documented():
+def test_response_schemas_documented(openapi_schema):
     """Test that all response schemas are documented"""
-    client = TestClient(app)
-    response = client.get("/openapi.json")
-    schema = response.json()
+    schema = openapi_schema
     
     # Test analyze endpoint response
     analyze_endpoint = schema["paths"]["/analyze"]
@@ -82,26 +100,19 @@ def test_response_schemas_documented():
     assert "content" in recommendations_endpoint["get"]["responses"]["200"]
     assert "application/json" in recommendations_endpoint["get"]["responses"]["200"]["content"]
 
-def test_error_responses_documented():
+def test_error_responses_documented(schema_index):
     """Test that error responses are documented"""
-    client = TestClient(app)
-    response = client.get("/openapi.json")
-    schema = response.json()
-    
     # Test common error responses
-    error_codes = ["400", "401", "403", "404", "429", "500"]
-    
-    for endpoint in schema["paths"].values():
-        for method in endpoint.values():
-            if "responses" in method:
-                for code in error_codes:
-                    assert code in method["responses"], f"Error response {code} not documented"
+    missing = {
+        operation: sorted(_ERROR_CODES - responses)
+        for operation, responses in schema_index["operation_responses"].items()
+        if not _ERROR_CODES <= responses
+    }
+    assert not missing, f"Error responses not documented: {missing}"
 
-def test_security_schemes_documented():
+def test_security_schemes_documented(openapi_schema):
     """Test that security schemes are documented"""
-    client = TestClient(app)
-    response = client.get("/openapi.json")
-    schema = response.json()
+    schema = openapi_schema
     
     # Verify security schemes
     assert "components" in schema
@@ -114,11 +125,9 @@ def test_security_schemes_documented():
     assert bearer_auth["scheme"] == "bearer"
     assert bearer_auth["bearerFormat"] == "JWT"
 
-def test_examples_provided():
+def test_examples_provided(openapi_schema):
     """Test that examples are provided for request/response bodies"""
-    client = TestClient(app)
-    response = client.get("/openapi.json")
-    schema = response.json()
+    schema = openapi_schema
     
     # Test analyze endpoint examples
     analyze_endpoint = schema["paths"]["/analyze"]
@@ -128,40 +137,25 @@ def test_examples_provided():
     progress_endpoint = schema["paths"]["/api/activities/{activity_id}/progress"]
     assert "examples" in progress_endpoint["post"]["requestBody"]["content"]["application/json"]
 
-def test_tags_used():
+def test_tags_used(openapi_schema, schema_index):
     """Test that endpoints are properly tagged"""
-    client = TestClient(app)
-    response = client.get("/openapi.json")
-    schema = response.json()
-    
-    expected_tags = [
-        "Activities",
-        "Emotions",
-        "Sessions",
-        "Health"
-    ]
+    schema = openapi_schema
     
     # Verify tags exist
     assert "tags" in schema
-    for tag in expected_tags:
-        assert any(t["name"] == tag for t in schema["tags"])
+    assert _EXPECTED_TAGS <= {t["name"] for t in schema["tags"]}
     
     # Verify endpoints use tags
-    for endpoint in schema["paths"].values():
-        for method in endpoint.values():
-            if "tags" in method:
-                assert any(tag in method["tags"] for tag in expected_tags)
+    for tags in schema_index["operation_tags"].values():
+        assert not _EXPECTED_TAGS.isdisjoint(tags)
 
-def test_descriptions_provided():
+def test_descriptions_provided(openapi_schema, schema_index):
     """Test that descriptions are provided for all components"""
-    client = TestClient(app)
-    response = client.get("/openapi.json")
-    schema = response.json()
+    schema = openapi_schema
     
     # Verify endpoint descriptions
-    for path, endpoint in schema["paths"].items():
-        for method, details in endpoint.items():
-            assert "description" in details, f"Missing description for {method.upper()} {path}"
+    missing = schema_index["missing_descriptions"]
+    assert not missing, f"Missing description for {', '.join(missing)}"
     
     # Verify schema descriptions
     for name, component in schema["components"]["schemas"].items():
@@ -37,16 +37,13 @@ async def insert_sample_data():
         session_id = await db.create_session(session_data)
         logger.info(f"Created test session with ID: {session_id}")
 
-        # Insert activity progress
+        # Activity progress, emotion analysis and activity history are
+        # independent writes keyed by session_id, so send them together
         progress_data = {
             "progress": 75.5,
             "completed_steps": [1, 2, 3],
             "time_spent": 1800  # 30 minutes
         }
-        await db.save_activity_progress(session_id, "activity_1", progress_data)
-        logger.info("Inserted activity progress")
-
-        # Insert emotion analysis
         emotion_data = {
             "emotions": {
                 "calm": 0.8,
@@ -58,10 +55,6 @@ async def insert_sample_data():
             "confidence": 0.85,
             "text": "I feel very calm and relaxed after my meditation session"
         }
-        await db.save_emotion_analysis(session_id, emotion_data)
-        logger.info("Inserted emotion analysis")
-
-        # Insert activity history
         history_data = {
             "activity_id": "activity_1",
             "activity_title": "Morning Meditation",
@@ -72,8 +65,12 @@ async def insert_sample_data():
             "progress": 100,
             "steps_completed": [1, 2, 3, 4, 5]
         }
-        await db.save_activity_history(session_id, history_data)
-        logger.info("Inserted activity history")
+        await asyncio.gather(
+            db.save_activity_progress(session_id, "activity_1", progress_data),
+            db.save_emotion_analysis(session_id, emotion_data),
+            db.save_activity_history(session_id, history_data)
+        )
+        logger.info("Inserted activity progress, emotion analysis and activity history")
 
         # Get and verify the data
         stats = await db.get_activity_stats(session_id)
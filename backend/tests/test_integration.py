@@ -1,11 +1,14 @@
 import pytest
 import asyncio
+import re
 from datetime import datetime
 from services.emotion_service import EmotionService
 from services.recommendation_service import RecommendationService
 from services.user_service import UserService
 from services.session_service import SessionService
 
+STRESS_CONTEXT = re.compile(r"stress|anxiety", re.IGNORECASE)
+
 @pytest.mark.asyncio
 async def test_emotion_to_recommendation_flow(mock_redis):
     # Initialize services
@@ -31,8 +34,7 @@ async def test_emotion_to_recommendation_flow(mock_redis):
     # Verify recommendations are relevant
     assert len(recommendations) > 0
     assert any(
-        "stress" in activity["emotional_context"].lower() or
-        "anxiety" in activity["emotional_context"].lower()
+        STRESS_CONTEXT.search(activity["emotional_context"])
         for activity in recommendations
     )
 
@@ -57,14 +59,11 @@ async def test_user_preferences_affect_recommendations(mock_redis, test_user_id)
     )
     
     # Verify recommendations match preferences
+    preferred = re.compile("|".join(map(re.escape, preferences["preferred_activities"])), re.IGNORECASE)
     for activity in recommendations:
         assert activity["difficulty"] == "beginner"
         assert activity["duration"] == "short"
-        assert any(
-            pref in activity["title"].lower() or
-            pref in activity["description"].lower()
-            for pref in preferences["preferred_activities"]
-        )
+        assert preferred.search(activity["title"]) or preferred.search(activity["description"])
 
 @pytest.mark.asyncio
 async def test_activity_completion_flow(mock_redis, test_user_id, test_activity_id):
@@ -148,8 +147,8 @@ async def test_emotion_trends_analysis(mock_redis, test_user_id):
         "I'm really stressed about work"
     ]
     
-    for text in test_texts:
-        emotions, _ = emotion_service.detect_emotions(text)
+    batch_results = emotion_service.batch_detect_emotions(test_texts)
+    for text, (emotions, _) in zip(test_texts, batch_results):
         session_service.add_emotion_record(session_id, emotions, text)
     
     # Get emotion trends
@@ -1,12 +1,24 @@
+import orjson
 import pytest
-import redis
 from datetime import datetime
 from services.user_service import UserService
 from services.session_service import SessionService
 
 @pytest.fixture
-def redis_client():
-    return redis.Redis(host='localhost', port=6379, db=0)
+def redis_client(mock_redis):
+    # In-process fakeredis (see conftest) instead of a live server on localhost
+    return mock_redis
+
+def _hash_fields(mapping):
+    """Flatten a seed dict into HSET field values; nested values become JSON."""
+    return {
+        field: value if isinstance(value, (str, int, float)) else orjson.dumps(value).decode()
+        for field, value in mapping.items()
+    }
+
+async def seed_hash(redis_client, key, mapping):
+    # A single variadic HSET (not the deprecated HMSET)
+    await redis_client.hset(key, mapping=_hash_fields(mapping))
 
 @pytest.fixture
 def user_service(redis_client):
@@ -27,13 +39,14 @@ async def test_user_preferences_migration(redis_client, user_service):
             "difficulty": "beginner"
         }
     }
-    redis_client.hset("user:test_user", mapping=old_data)
+    await seed_hash(redis_client, "user:test_user", old_data)
     
     # Migrate to new format
     await user_service.migrate_user_preferences("test_user")
     
-    # Verify new format
-    new_data = await user_service.get_user_preferences("test_user")
+    # Verify new format, reading the migrated user and an untouched one together
+    new_data, untouched = await user_service.get_user_preferences_many(["test_user", "other_user"])
+    assert untouched.preferred_activities == []
     assert "preferred_activities" in new_data
     assert "preferred_duration" in new_data
     assert "preferred_difficulty" in new_data
@@ -50,7 +63,7 @@ async def test_activity_history_migration(redis_client, user_service):
             "time": 300
         }
     ]
-    redis_client.set("history:test_user", str(old_history))
+    await redis_client.set("history:test_user", orjson.dumps(old_history))
     
     # Migrate to new format
     await user_service.migrate_activity_history("test_user")
@@ -71,7 +84,7 @@ async def test_session_data_migration(redis_client, session_service):
         "created": "2024-01-01",
         "emotions": ["happy", "calm"]
     }
-    redis_client.hset("session:test_session", mapping=old_session)
+    await seed_hash(redis_client, "session:test_session", old_session)
     
     # Migrate to new format
     await session_service.migrate_session_data("test_session")
@@ -91,7 +104,7 @@ async def test_activity_progress_migration(redis_client, user_service):
         "steps": [1, 2],
         "time": 300
     }
-    redis_client.hset("progress:test_user:activity_1", mapping=old_progress)
+    await seed_hash(redis_client, "progress:test_user:activity_1", old_progress)
     
     # Migrate to new format
     await user_service.migrate_activity_progress("test_user", "activity_1")
@@ -107,7 +120,7 @@ async def test_favorites_migration(redis_client, user_service):
     """Test migration of favorites data structure"""
     # Create old format data
     old_favorites = ["activity_1", "activity_2"]
-    redis_client.sadd("favorites:test_user", *old_favorites)
+    await redis_client.sadd("favorites:test_user", *old_favorites)
     
     # Migrate to new format
     await user_service.migrate_favorites("test_user")
@@ -129,7 +142,7 @@ async def test_emotion_records_migration(redis_client, session_service):
             "text": "I am happy"
         }
     ]
-    redis_client.set("emotions:test_session", str(old_records))
+    await redis_client.set("emotions:test_session", orjson.dumps(old_records))
     
     # Migrate to new format
     await session_service.migrate_emotion_records("test_session")
@@ -152,7 +165,7 @@ async def test_recommendation_history_migration(redis_client, user_service):
             "score": 0.8
         }
     ]
-    redis_client.set("recommendations:test_user", str(old_history))
+    await redis_client.set("recommendations:test_user", orjson.dumps(old_history))
     
     # Migrate to new format
     await user_service.migrate_recommendation_history("test_user")
@@ -175,7 +188,7 @@ async def test_migration_rollback(redis_client, user_service):
             "difficulty": "beginner"
         }
     }
-    redis_client.hset("user:test_user", mapping=old_data)
+    await seed_hash(redis_client, "user:test_user", old_data)
     
     # Start migration
     try:
@@ -183,8 +196,8 @@ async def test_migration_rollback(redis_client, user_service):
         raise Exception("Migration should fail")
     except Exception:
         # Verify rollback
-        data = redis_client.hgetall("user:test_user")
-        assert data == old_data
+        data = await redis_client.hgetall("user:test_user")
+        assert data == _hash_fields(old_data)
 
 @pytest.mark.asyncio
 async def test_migration_idempotency(redis_client, user_service):
@@ -195,7 +208,7 @@ async def test_migration_idempotency(redis_client, user_service):
         "preferred_duration": "short",
         "preferred_difficulty": "beginner"
     }
-    redis_client.hset("user:test_user", mapping=new_data)
+    await seed_hash(redis_client, "user:test_user", new_data)
     
     # Run migration again
     await user_service.migrate_user_preferences("test_user")
@@ -2,10 +2,14 @@ import pytest
 import time
 import asyncio
 from concurrent.futures import ThreadPoolExecutor
-from services.emotion_service import EmotionService
-from services.recommendation_service import RecommendationService
 from services.user_service import UserService
 
+_TEST_TEXTS = (
+    "I am happy",  # Short
+    "I am feeling really happy and excited about my new project! The future looks bright.",  # Medium
+    "I am feeling really happy and excited about my new project! The future looks bright. " * 10  # Long
+)
+
 def measure_time(func):
     def wrapper(*args, **kwargs):
         start_time = time.time()
@@ -15,17 +19,9 @@ def measure_time(func):
     return wrapper
 
 @pytest.mark.asyncio
-async def test_emotion_analysis_performance():
-    emotion_service = EmotionService()
-    
+async def test_emotion_analysis_performance(emotion_service):
     # Test with different text lengths
-    test_texts = [
-        "I am happy",  # Short
-        "I am feeling really happy and excited about my new project! The future looks bright.",  # Medium
-        "I am feeling really happy and excited about my new project! The future looks bright. " * 10  # Long
-    ]
-    
-    for text in test_texts:
+    for text in _TEST_TEXTS:
         start_time = time.time()
         emotions, _ = emotion_service.detect_emotions(text)
         end_time = time.time()
@@ -36,9 +32,8 @@ async def test_emotion_analysis_performance():
         assert len(emotions) > 0
 
 @pytest.mark.asyncio
-async def test_recommendation_performance(mock_redis, test_user_id):
+async def test_recommendation_performance(mock_redis, test_user_id, recommendation_service):
     user_service = UserService(mock_redis)
-    recommendation_service = RecommendationService()
     
     # Test with different numbers of activities
     activity_counts = [5, 10, 20]
@@ -60,24 +55,24 @@ async def test_recommendation_performance(mock_redis, test_user_id):
 async def test_concurrent_requests(mock_redis, test_user_id):
     user_service = UserService(mock_redis)
     
-    # Test concurrent activity progress updates
-    async def update_progress(activity_id, progress):
+    # Test concurrent activity progress updates, flushed as one pipeline
+    async def update_progress(activity_id, progress, pipe):
         return await user_service.update_activity_progress(
             test_user_id,
             activity_id,
             progress,
             [1],
-            100
+            100,
+            pipe=pipe
         )
     
-    # Create multiple concurrent updates
-    tasks = [
-        update_progress(f"activity_{i}", i/10)
-        for i in range(10)
-    ]
-    
     start_time = time.time()
-    results = await asyncio.gather(*tasks)
+    async with mock_redis.pipeline(transaction=False) as pipe:
+        results = await asyncio.gather(*[
+            update_progress(f"activity_{i}", i/10, pipe)
+            for i in range(10)
+        ])
+        await pipe.execute()
     end_time = time.time()
     
     # Assert all updates completed successfully
@@ -91,20 +86,25 @@ async def test_redis_performance(mock_redis, test_user_id):
     
     # Test Redis operations performance
     operations = 100
-    start_time = time.time()
-    
-    for i in range(operations):
-        await user_service.update_activity_progress(
-            test_user_id,
-            f"activity_{i}",
-            0.5,
-            [1, 2],
-            300
-        )
+    entries = [
+        {
+            "activity_id": f"activity_{i}",
+            "progress": 0.5,
+            "completed_steps": [1, 2],
+            "time_spent": 300
+        }
+        for i in range(operations)
+    ]
     
+    start_time = time.time()
+    results = await user_service.update_activity_progress_bulk(test_user_id, entries)
     end_time = time.time()
     total_time = end_time - start_time
     
+    assert len(results) == operations
+    progress = await user_service.get_activity_progress(test_user_id, "activity_99")
+    assert progress.completed_steps == [1, 2]
+    
     # Assert reasonable average operation time
     assert total_time / operations < 0.01  # Each operation should take less than 10ms
 
@@ -123,13 +123,7 @@ async def test_memory_usage(mock_redis, test_user_id):
         })
     
     start_time = time.time()
-    for entry in large_history:
-        await user_service.add_to_activity_history(
-            test_user_id,
-            entry["activity_id"],
-            entry["duration"],
-            entry["completed_steps"]
-        )
+    await user_service.add_to_activity_history_many(test_user_id, large_history)
     end_time = time.time()
     
     # Assert reasonable performance with large dataset
@@ -137,4 +131,5 @@ async def test_memory_usage(mock_redis, test_user_id):
     
     # Verify data integrity
     history = await user_service.get_activity_history(test_user_id)
-    assert len(history) == 50  # Should maintain limit of 50 entries 
\ No newline at end of file
+    assert len(history) == 50  # Should maintain limit of 50 entries
+    assert history[0]["activity_id"] == "activity_999"  # Newest first 
\ No newline at end of file
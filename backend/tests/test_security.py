@@ -1,21 +1,34 @@
 import pytest
+import asyncio
 import jwt
 from datetime import datetime, timedelta
 from fastapi.testclient import TestClient
 from app import app
 from services.user_service import UserService
 
-@pytest.fixture
-def test_token():
+def _make_token(sub, expires_in):
     return jwt.encode(
         {
-            "sub": "test_user_123",
-            "exp": datetime.utcnow() + timedelta(hours=1)
+            "sub": sub,
+            "exp": datetime.utcnow() + expires_in
         },
         "test_secret",
         algorithm="HS256"
     )
 
+# Tokens are signed once per session and shared by the tests below
+@pytest.fixture(scope="session")
+def test_token():
+    return _make_token("test_user_123", timedelta(hours=1))
+
+@pytest.fixture(scope="session")
+def user2_token():
+    return _make_token("user2", timedelta(hours=1))
+
+@pytest.fixture(scope="session")
+def expired_token():
+    return _make_token("test_user_123", -timedelta(hours=1))
+
 def test_authentication_required(test_client):
     # Test endpoints that require authentication
     protected_endpoints = [
@@ -29,7 +42,7 @@ def test_authentication_required(test_client):
         response = test_client.get(endpoint)
         assert response.status_code == 401
 
-def test_token_validation(test_client, test_token):
+def test_token_validation(test_client, test_token, expired_token):
     # Test with valid token
     headers = {"Authorization": f"Bearer {test_token}"}
     response = test_client.get("/api/activities/favorites", headers=headers)
@@ -41,20 +54,28 @@ def test_token_validation(test_client, test_token):
     assert response.status_code == 401
     
     # Test with expired token
-    expired_token = jwt.encode(
-        {
-            "sub": "test_user_123",
-            "exp": datetime.utcnow() - timedelta(hours=1)
-        },
-        "test_secret",
-        algorithm="HS256"
-    )
     headers = {"Authorization": f"Bearer {expired_token}"}
     response = test_client.get("/api/activities/favorites", headers=headers)
     assert response.status_code == 401
 
 @pytest.mark.asyncio
-async def test_user_data_isolation(test_client, test_token, mock_redis):
+async def test_cached_token_expires(monkeypatch):
+    # A token decoded (and memoized) while valid must be rejected once past exp
+    from fastapi import HTTPException
+    from services import auth_service as auth_module
+    token = auth_module.auth_service.create_access_token(
+        {"sub": "test_user_123", "email": "test@example.com"},
+        expires_delta=timedelta(minutes=1)
+    )
+    payload = auth_module._decode_token(token)
+    
+    monkeypatch.setattr(auth_module.time, "time", lambda: payload["exp"] + 1)
+    with pytest.raises(HTTPException) as exc_info:
+        await auth_module.auth_service.verify_token(token)
+    assert exc_info.value.status_code == 401
+
+@pytest.mark.asyncio
+async def test_user_data_isolation(async_client, test_token, user2_token, mock_redis):
     headers = {"Authorization": f"Bearer {test_token}"}
     user_service = UserService(mock_redis)
     
@@ -70,17 +91,9 @@ async def test_user_data_isolation(test_client, test_token, mock_redis):
     )
     
     # Try to access user1's data as user2
-    user2_token = jwt.encode(
-        {
-            "sub": "user2",
-            "exp": datetime.utcnow() + timedelta(hours=1)
-        },
-        "test_secret",
-        algorithm="HS256"
-    )
     headers2 = {"Authorization": f"Bearer {user2_token}"}
     
-    response = test_client.get(f"/api/activities/{user1_id}/progress", headers=headers2)
+    response = await async_client.get(f"/api/activities/{user1_id}/progress", headers=headers2)
     assert response.status_code == 403
 
 def test_input_validation(test_client, test_token):
@@ -107,16 +120,16 @@ def test_input_validation(test_client, test_token):
     )
     assert response.status_code == 404
 
-def test_rate_limiting(test_client):
-    # Test rapid requests to the same endpoint
-    for _ in range(100):
-        response = test_client.post(
-            "/analyze",
-            json={"text": "I am happy"}
-        )
+@pytest.mark.asyncio
+async def test_rate_limiting(async_client):
+    # Test a burst of concurrent requests to the same endpoint
+    await asyncio.gather(*[
+        async_client.post("/analyze", json={"text": "I am happy"})
+        for _ in range(100)
+    ])
     
     # Should be rate limited after certain number of requests
-    response = test_client.post(
+    response = await async_client.post(
         "/analyze",
         json={"text": "I am happy"}
     )
@@ -141,7 +154,7 @@ async def test_data_encryption(test_client, test_token, mock_redis):
     stored_data = await user_service.get_user_preferences("test_user_123")
     assert stored_data.get("sensitive_info") != "secret_data"
 
-def test_session_security(test_client, test_token):
+def test_session_security(test_client, test_token, expired_token):
     headers = {"Authorization": f"Bearer {test_token}"}
     
     # Test session creation
@@ -157,14 +170,6 @@ def test_session_security(test_client, test_token):
     assert response.status_code == 403
     
     # Test session expiration
-    expired_token = jwt.encode(
-        {
-            "sub": "test_user_123",
-            "exp": datetime.utcnow() - timedelta(hours=1)
-        },
-        "test_secret",
-        algorithm="HS256"
-    )
     response = test_client.get(
         f"/session/{session_id}",
         headers={"Authorization": f"Bearer {expired_token}"}
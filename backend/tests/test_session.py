@@ -1,14 +1,25 @@
 import pytest
-from fastapi.testclient import TestClient
-from app import app
+import asyncio
 import json
 from datetime import datetime, timedelta
 
-client = TestClient(app)
+def _create_session(client):
+    response = client.post("/session/create?user_id=test_user")
+    return response.json()["session_id"]
+
+@pytest.fixture(scope="module")
+def session_id(test_client):
+    """One session shared by the read-mostly tests in this module."""
+    return _create_session(test_client)
+
+@pytest.fixture
+def fresh_session_id(test_client):
+    """A session of its own, for tests that destroy it."""
+    return _create_session(test_client)
 
-def test_create_session():
+def test_create_session(test_client):
     """Test creating a new session."""
-    response = client.post("/session/create?user_id=test_user")
+    response = test_client.post("/session/create?user_id=test_user")
     assert response.status_code == 200
     data = response.json()
     assert "session_id" in data
@@ -17,118 +28,98 @@ def test_create_session():
     assert "last_active" in data
     assert "preferences" in data
 
-def test_get_session():
+def test_get_session(test_client, session_id):
     """Test retrieving a session."""
-    # First create a session
-    create_response = client.post("/session/create?user_id=test_user")
-    session_id = create_response.json()["session_id"]
-    
     # Then get the session
-    response = client.get(f"/session/{session_id}")
+    response = test_client.get(f"/session/{session_id}")
     assert response.status_code == 200
     data = response.json()
     assert data["session_id"] == session_id
     assert data["user_id"] == "test_user"
 
-def test_get_nonexistent_session():
+def test_get_nonexistent_session(test_client):
     """Test retrieving a non-existent session."""
-    response = client.get("/session/nonexistent")
+    response = test_client.get("/session/nonexistent")
     assert response.status_code == 404
 
-def test_update_preferences():
+def test_update_preferences(test_client, session_id):
     """Test updating user preferences."""
-    # First create a session
-    create_response = client.post("/session/create?user_id=test_user")
-    session_id = create_response.json()["session_id"]
-    
     # Update preferences
     preferences = {
         "difficulty_level": "intermediate",
         "preferred_duration": "medium",
         "favorite_activities": ["meditation", "yoga"]
     }
-    response = client.post(f"/session/{session_id}/preferences", json=preferences)
+    response = test_client.post(f"/session/{session_id}/preferences", json=preferences)
     assert response.status_code == 200
     
     # Verify preferences were updated
-    get_response = client.get(f"/session/{session_id}")
+    get_response = test_client.get(f"/session/{session_id}")
     assert get_response.status_code == 200
     assert get_response.json()["preferences"] == preferences
 
-def test_emotion_trends():
+def test_emotion_trends(test_client, session_id):
     """Test getting emotion trends."""
-    # Create session
-    create_response = client.post("/session/create?user_id=test_user")
-    session_id = create_response.json()["session_id"]
-    
     # Add some emotion records
     emotions = {"happy": 0.8, "sad": 0.2}
     text = "I'm feeling happy today"
-    client.post("/analyze", json={"text": text}, params={"session_id": session_id})
+    test_client.post("/analyze", json={"text": text}, params={"session_id": session_id})
     
     # Get trends
-    response = client.get(f"/session/{session_id}/trends")
+    response = test_client.get(f"/session/{session_id}/trends")
     assert response.status_code == 200
     data = response.json()
     assert "trends" in data
     assert "total_records" in data
     assert data["total_records"] > 0
 
-def test_activity_preferences():
+def test_activity_preferences(test_client, session_id):
     """Test getting activity preferences."""
-    # Create session
-    create_response = client.post("/session/create?user_id=test_user")
-    session_id = create_response.json()["session_id"]
-    
     # Add some activity records
     emotion_data = {
         "emotions": {"happy": 0.8, "sad": 0.2},
         "primary_emotion": "happy",
         "summary": "Feeling happy"
     }
-    client.post("/recommend", json=emotion_data, params={"session_id": session_id})
+    test_client.post("/recommend", json=emotion_data, params={"session_id": session_id})
     
     # Get preferences
-    response = client.get(f"/session/{session_id}/preferences")
+    response = test_client.get(f"/session/{session_id}/preferences")
     assert response.status_code == 200
     data = response.json()
     assert "preferred_activities" in data
     assert "total_activities" in data
     assert data["total_activities"] > 0
 
-def test_delete_session():
+def test_delete_session(test_client, fresh_session_id):
     """Test deleting a session."""
-    # Create session
-    create_response = client.post("/session/create?user_id=test_user")
-    session_id = create_response.json()["session_id"]
+    session_id = fresh_session_id
     
     # Delete session
-    response = client.delete(f"/session/{session_id}")
+    response = test_client.delete(f"/session/{session_id}")
     assert response.status_code == 200
     
     # Verify session is deleted
-    get_response = client.get(f"/session/{session_id}")
+    get_response = test_client.get(f"/session/{session_id}")
     assert get_response.status_code == 404
 
-def test_session_integration():
+@pytest.mark.asyncio
+async def test_session_integration(async_client, session_id):
     """Test full session integration with emotion analysis and recommendations."""
-    # Create session
-    create_response = client.post("/session/create?user_id=test_user")
-    session_id = create_response.json()["session_id"]
-    
     # Analyze emotions
     text = "I'm feeling happy and excited today"
-    emotion_response = client.post("/analyze", json={"text": text}, params={"session_id": session_id})
+    emotion_response = await async_client.post("/analyze", json={"text": text}, params={"session_id": session_id})
     assert emotion_response.status_code == 200
     
     # Get recommendations
     emotion_data = emotion_response.json()
-    recommend_response = client.post("/recommend", json=emotion_data, params={"session_id": session_id})
+    recommend_response = await async_client.post("/recommend", json=emotion_data, params={"session_id": session_id})
     assert recommend_response.status_code == 200
     
-    # Check trends and preferences
-    trends_response = client.get(f"/session/{session_id}/trends")
+    # Check trends and preferences (independent reads, issued together)
+    trends_response, preferences_response = await asyncio.gather(
+        async_client.get(f"/session/{session_id}/trends"),
+        async_client.get(f"/session/{session_id}/preferences")
+    )
     assert trends_response.status_code == 200
-    
-    preferences_response = client.get(f"/session/{session_id}/preferences")
-    assert preferences_response.status_code == 200 
\ No newline at end of file
+    assert preferences_response.status_code == 200
@@ -0,0 +1,16 @@
+from services.session_service import SIGNIFICANT_EMOTION_SCORE, pack_emotions, unpack_emotions
+
+def test_emotion_record_packing():
+    """Test emotion scores survive the packed float16 round-trip."""
+    emotions = {"joy": 0.8, "fear": 0.2}
+    unpacked = unpack_emotions(pack_emotions(emotions))
+    assert unpacked.keys() == emotions.keys()
+    assert all(abs(unpacked[k] - v) < 1e-3 for k, v in emotions.items())
+
+def test_emotion_record_packing_keeps_trend_threshold():
+    """Test float16 rounding never moves a score across the trend threshold."""
+    # 0.100005 rounds to 0.09998 in plain float16
+    emotions = {"joy": 0.100005, "fear": SIGNIFICANT_EMOTION_SCORE}
+    unpacked = unpack_emotions(pack_emotions(emotions))
+    assert unpacked["joy"] > SIGNIFICANT_EMOTION_SCORE
+    assert unpacked["fear"] <= SIGNIFICANT_EMOTION_SCORE
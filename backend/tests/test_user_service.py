@@ -1,6 +1,6 @@
 import pytest
 from datetime import datetime
-from services.user_service import UserService, UserPreferences, ActivityProgress
+from services.user_service import UserService, UserPreferences, ActivityProgress, build_activity_table
 
 @pytest.mark.asyncio
 async def test_get_user_preferences(mock_redis, test_user_id):
@@ -134,4 +134,31 @@ async def test_generate_recommendations(mock_redis, test_user_id):
     )
     
     assert len(recommendations) == 2
-    assert recommendations[0]["id"] == "activity1"  # Should be first due to being favorite 
\ No newline at end of file
+    assert recommendations[0]["id"] == "activity1"  # Should be first due to being favorite
+
+@pytest.mark.asyncio
+async def test_generate_recommendations_prebuilt_table(mock_redis, test_user_id):
+    service = UserService(mock_redis)
+    await service.toggle_favorite(test_user_id, "activity2")
+    
+    # Duplicate ids all get the favorite bonus, as with per-activity scoring
+    available_activities = [
+        {"id": "activity1", "difficulty": "advanced", "duration": "long", "categories": []},
+        {"id": "activity2", "difficulty": "advanced", "duration": "long", "categories": []},
+        {"id": "activity2", "difficulty": "advanced", "duration": "long", "categories": []}
+    ]
+    table = build_activity_table(available_activities)
+    
+    recommendations = await service.generate_recommendations(
+        test_user_id,
+        available_activities,
+        limit=3,
+        activity_table=table
+    )
+    
+    assert [r["id"] for r in recommendations] == ["activity2", "activity2", "activity1"]
+    assert recommendations == await service.generate_recommendations(
+        test_user_id,
+        available_activities,
+        limit=3
+    )
@@ -3,6 +3,9 @@ import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
 from pathlib import Path
+import hashlib
+import io
+import os
 import json
 from collections import Counter
 import re
@@ -13,76 +16,158 @@ import logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# URLs, special characters and digits, stripped in a single pass
+_CLEAN_RE = re.compile(r'http\S+|www\S+|[^\w\s]|\d+')
+
 class GoEmotionsAnalyzer:
-    def __init__(self, data_path: str):
+    def __init__(self, data_path: str, chunk_size: int = 100_000, use_cache: bool = True):
         self.data_path = data_path
+        self.chunk_size = chunk_size
+        self.use_cache = use_cache
         self.df = None
         self.emotion_columns = None
+        self.emotion_totals = None  # label count per emotion
+        self.emotion_xtx = None  # label co-occurrence counts (X^T X)
+        self.emotion_counts = None  # emotion -> count, sorted, set by analyze_emotions
         self.text_column = 'text'
         
     def load_data(self) -> None:
         """Load and perform initial data inspection."""
         logger.info(f"Loading data from {self.data_path}")
-        self.df = pd.read_csv(self.data_path)
-        logger.info(f"Dataset shape: {self.df.shape}")
-        
-        # Identify emotion columns (all columns except metadata columns)
+        # Identify emotion columns (all columns except metadata columns) from the header
         metadata_columns = ['text', 'id', 'author', 'subreddit', 'link_id', 
                           'parent_id', 'created_utc', 'rater_id', 'example_very_unclear']
-        self.emotion_columns = [col for col in self.df.columns if col not in metadata_columns]
+        columns = pd.read_csv(self.data_path, nrows=0).columns
+        self.emotion_columns = [col for col in columns if col not in metadata_columns]
         
-        # Display basic information
-        logger.info("\nDataset Info:")
-        logger.info(self.df.info())
+        # Compact dtypes: 0/1 labels as int8, repeated names as categories
+        dtypes = {col: 'int8' for col in self.emotion_columns}
+        dtypes.update({
+            col: dtype for col, dtype in
+            {'subreddit': 'category', 'author': 'category', 'example_very_unclear': 'bool'}.items()
+            if col in columns
+        })
         
-        # Display sample rows
-        logger.info("\nSample rows:")
-        logger.info(self.df.head())
+        cache_path = self._cache_path()
+        if self.use_cache and cache_path.exists():
+            # Label statistics and per-row lengths/counts come from the cache, so
+            # only the small metadata columns are parsed
+            logger.info(f"Using cached arrays from {cache_path}")
+            with np.load(cache_path) as cached:
+                self.emotion_totals = cached['emotion_totals']
+                self.emotion_xtx = cached['emotion_xtx']
+                emotion_count = cached['emotion_count']
+                text_length = cached['text_length']
+            meta_columns = [col for col in ('subreddit', 'author', 'example_very_unclear') if col in columns]
+            self.df = pd.read_csv(self.data_path, usecols=meta_columns,
+                                  dtype={col: dtypes[col] for col in meta_columns})
+            self.df['emotion_count'] = emotion_count
+            self.df['text_length'] = text_length
+            logger.info(f"Dataset shape: {self.df.shape}")
+            return
         
+        # Stream the CSV in chunks, accumulating the label statistics as we go, so the
+        # full label matrix is never held; each row keeps only its emotion count
+        n_emotions = len(self.emotion_columns)
+        self.emotion_totals = np.zeros(n_emotions, dtype=np.int64)
+        self.emotion_xtx = np.zeros((n_emotions, n_emotions), dtype=np.float64)
+        chunks = []
+        for chunk in pd.read_csv(self.data_path, dtype=dtypes, chunksize=self.chunk_size):
+            labels = chunk[self.emotion_columns].to_numpy(dtype=np.int8)
+            self.emotion_totals += labels.sum(axis=0, dtype=np.int64)
+            # float32 so the product runs as a BLAS sgemm; counts stay exact below 2**24 rows per chunk
+            wide = labels.astype(np.float32)
+            self.emotion_xtx += wide.T @ wide
+            chunk = chunk.drop(columns=self.emotion_columns)
+            chunk['emotion_count'] = labels.sum(axis=1, dtype=np.int16)
+            chunks.append(chunk)
+        self.df = pd.concat(chunks, ignore_index=True)
+        # Chunks may see different category sets, which concat widens to object
+        for col in ('subreddit', 'author'):
+            if col in self.df.columns:
+                self.df[col] = self.df[col].astype('category')
+        logger.info(f"Dataset shape: {self.df.shape}")
+        
+        # DataFrame.info() scans every column, so only build it when it will be logged
+        if logger.isEnabledFor(logging.DEBUG):
+            buf = io.StringIO()
+            self.df.info(buf=buf)
+            logger.debug("\nDataset Info:\n%s", buf.getvalue())
+            logger.debug("\nSample rows:\n%s", self.df.head().to_string())
+        
+    def _cache_path(self) -> Path:
+        """Path of the derived-array cache, keyed on the data file's mtime and size."""
+        stat = os.stat(self.data_path)
+        key = hashlib.md5(f"{stat.st_mtime_ns}:{stat.st_size}".encode()).hexdigest()[:12]
+        return Path('data/processed') / f"cache_{key}.npz"
+    
+    def save_cache(self) -> None:
+        """Persist label statistics and per-row lengths/counts for later runs."""
+        cache_path = self._cache_path()
+        if not self.use_cache or cache_path.exists():
+            return
+        np.savez_compressed(
+            cache_path,
+            emotion_totals=self.emotion_totals,
+            emotion_xtx=self.emotion_xtx,
+            emotion_count=self.df['emotion_count'].to_numpy(),
+            text_length=self.df['text_length'].to_numpy()
+        )
+        logger.info(f"Cached derived arrays to {cache_path}")
+    
     def clean_text(self, text: str) -> str:
         """Clean text data."""
         if not isinstance(text, str):
             return ""
-        # Convert to lowercase
-        text = text.lower()
-        # Remove URLs
-        text = re.sub(r'http\S+|www\S+|https\S+', '', text, flags=re.MULTILINE)
-        # Remove special characters and digits
-        text = re.sub(r'[^\w\s]', '', text)
-        text = re.sub(r'\d+', '', text)
+        # Lowercase, remove URLs/special characters/digits, collapse whitespace
+        return ' '.join(_CLEAN_RE.sub('', text.lower()).split())
+    
+    def clean_text_column(self, texts: pd.Series) -> pd.Series:
+        """Clean a whole column of text at once; same rules as clean_text."""
+        s = texts.fillna('').astype(str).str.lower()
+        s = s.str.replace(_CLEAN_RE, '', regex=True)
         # Remove extra whitespace
-        text = ' '.join(text.split())
-        return text
+        return s.str.split().str.join(' ')
     
-    def analyze_emotions(self) -> Dict:
+    def analyze_emotions(self, plot: bool = True) -> Dict:
         """Analyze emotion distribution and patterns."""
+        if self.emotion_counts is not None and not plot:
+            return self.emotion_counts
+        
         logger.info("\nAnalyzing emotion distribution...")
         
         # Calculate emotion frequencies
-        emotion_counts = self.df[self.emotion_columns].sum().sort_values(ascending=False)
+        emotion_counts = pd.Series(
+            self.emotion_totals, index=self.emotion_columns
+        ).sort_values(ascending=False)
+        self.emotion_counts = emotion_counts.to_dict()
         
-        # Create emotion distribution plot
-        plt.figure(figsize=(12, 6))
-        sns.barplot(x=emotion_counts.index, y=emotion_counts.values)
-        plt.xticks(rotation=45, ha='right')
-        plt.title('Distribution of Emotions in Dataset')
-        plt.tight_layout()
-        plt.savefig('data/processed/emotion_distribution.png')
-        plt.close()
+        if plot:
+            # Create emotion distribution plot
+            plt.figure(figsize=(12, 6))
+            sns.barplot(x=emotion_counts.index, y=emotion_counts.values)
+            plt.xticks(rotation=45, ha='right')
+            plt.title('Distribution of Emotions in Dataset')
+            plt.tight_layout()
+            plt.savefig('data/processed/emotion_distribution.png')
+            plt.close()
         
-        return emotion_counts.to_dict()
+        return self.emotion_counts
     
     def analyze_text_length(self) -> None:
         """Analyze text length distribution."""
         logger.info("\nAnalyzing text length distribution...")
         
-        # Clean text and calculate lengths
-        self.df['cleaned_text'] = self.df[self.text_column].apply(self.clean_text)
-        self.df['text_length'] = self.df['cleaned_text'].apply(len)
+        # Clean text and calculate lengths (vectorized equivalent of clean_text);
+        # lengths are already present when loaded from the cache
+        if 'text_length' not in self.df.columns:
+            self.df['cleaned_text'] = self.clean_text_column(self.df[self.text_column])
+            self.df['text_length'] = self.df['cleaned_text'].str.len()
         
-        # Create text length distribution plot
+        # Create text length distribution plot (histogram computed in NumPy)
+        hist, edges = np.histogram(self.df['text_length'].to_numpy(), bins=50)
         plt.figure(figsize=(10, 6))
-        sns.histplot(data=self.df, x='text_length', bins=50)
+        plt.stairs(hist, edges, fill=True)
         plt.title('Distribution of Text Lengths')
         plt.xlabel('Text Length')
         plt.ylabel('Count')
@@ -98,7 +183,14 @@ class GoEmotionsAnalyzer:
         logger.info("\nAnalyzing emotion correlations...")
         
         # Calculate correlation matrix
-        corr_matrix = self.df[self.emotion_columns].corr()
+        # Pearson correlation from the streamed totals and co-occurrence counts
+        n = len(self.df)
+        mean = self.emotion_totals / n
+        cov = self.emotion_xtx / n - np.outer(mean, mean)
+        std = np.sqrt(np.diag(cov))
+        with np.errstate(divide='ignore', invalid='ignore'):  # constant columns give NaN, as with DataFrame.corr
+            corr = cov / np.outer(std, std)
+        corr_matrix = pd.DataFrame(corr, index=self.emotion_columns, columns=self.emotion_columns)
         
         # Create correlation heatmap
         plt.figure(figsize=(12, 10))
@@ -112,9 +204,7 @@ class GoEmotionsAnalyzer:
         """Analyze how many emotions are typically present per text."""
         logger.info("\nAnalyzing multi-emotion patterns...")
         
-        # Calculate number of emotions per text
-        self.df['emotion_count'] = self.df[self.emotion_columns].sum(axis=1)
-        
+        # Number of emotions per text ('emotion_count') is computed while loading
         # Create distribution plot
         plt.figure(figsize=(10, 6))
         sns.histplot(data=self.df, x='emotion_count', bins=range(0, 11))
@@ -145,7 +235,7 @@ class GoEmotionsAnalyzer:
             'dataset_size': int(len(self.df)),
             'unique_emotions': int(len(self.emotion_columns)),
             'avg_text_length': float(self.df['text_length'].mean()),
-            'emotion_distribution': {k: int(v) for k, v in self.analyze_emotions().items()},
+            'emotion_distribution': {k: int(v) for k, v in self.analyze_emotions(plot=False).items()},
             'text_length_stats': {k: to_py(v) for k, v in self.df['text_length'].describe().to_dict().items()},
             'emotion_count_stats': {k: to_py(v) for k, v in self.df['emotion_count'].describe().to_dict().items()},
             'metadata': {
@@ -173,6 +263,7 @@ class GoEmotionsAnalyzer:
         self.analyze_emotion_correlations()
         self.analyze_multi_emotion()
         self.generate_summary_report()
+        self.save_cache()
         
         logger.info("\nAnalysis complete! Check the data/processed directory for results.")
 
@@ -65,15 +65,16 @@ def load_data(data_path):
         print(f"Error loading data: {e}")
         return None, None, None
 
-def evaluate_with_emotion_service(emotion_service, texts, labels, label_cols, emotion_labels, sample_size=None):
+def evaluate_with_emotion_service(emotion_service, texts, labels, label_cols, emotion_labels, sample_size=None, batch_size=32):
     """Evaluate the emotion service on the given texts and labels."""
     print("Evaluating with EmotionService...")
     
     # Sample data if requested
     if sample_size and sample_size < len(texts):
-        indices = np.random.choice(len(texts), sample_size, replace=False)
+        rng = np.random.default_rng(0)
+        indices = rng.choice(len(texts), size=sample_size, replace=False, shuffle=False)
         texts = [texts[i] for i in indices]
-        labels = labels[indices]
+        labels = np.take(labels, indices, axis=0)
         print(f"Sampled {sample_size} examples for evaluation")
     
     # Create a mapping from emotion labels to indices
@@ -90,39 +91,35 @@ def evaluate_with_emotion_service(emotion_service, texts, labels, label_cols, em
     
     print(f"Mapped {len(label_col_to_emotion)} label columns to emotions")
     
-    # Process texts and get predictions
-    all_preds = []
-    all_labels = []
+    # Emotion name for each label column, by column position (None if unmapped)
+    col_emotion = [label_col_to_emotion.get(col) for col in label_cols]
     
-    for i, text in enumerate(tqdm(texts, desc="Processing texts")):
+    # Process texts and get predictions, writing rows into preallocated arrays
+    n = len(texts)
+    all_preds = np.zeros((n, len(label_cols)), dtype=np.int8)
+    all_labels = np.asarray(labels[:n]).astype(np.int8, copy=False)
+    
+    for start in tqdm(range(0, len(texts), batch_size), desc="Processing batches"):
+        batch = texts[start:start + batch_size]
         try:
-            # Get predictions from emotion service
-            emotions, primary_emotion = emotion_service.detect_emotions(text)
-            
-            # Convert predictions to binary format
-            pred = np.zeros(len(label_cols))
-            for col_idx, col in enumerate(label_cols):
-                if col in label_col_to_emotion:
-                    emotion = label_col_to_emotion[col]
-                    if emotion in emotions:
-                        pred[col_idx] = 1 if emotions[emotion] > 0.5 else 0
-            
-            all_preds.append(pred)
-            all_labels.append(labels[i])
-            
-            # Print progress
-            if (i + 1) % 50 == 0:
-                print(f"Processed {i + 1}/{len(texts)} examples")
-        
+            # Get predictions from emotion service, one forward pass per batch
+            batch_results = emotion_service.batch_detect_emotions(batch)
         except Exception as e:
-            print(f"Error processing text {i}: {e}")
-            # Use a zero vector as fallback
-            all_preds.append(np.zeros(len(label_cols)))
-            all_labels.append(labels[i])
-    
-    # Convert to numpy arrays
-    all_preds = np.array(all_preds)
-    all_labels = np.array(all_labels)
+            print(f"Error processing texts {start}-{start + len(batch) - 1}: {e}")
+            # Use zero vectors as fallback
+            batch_results = [({}, None)] * len(batch)
+        
+        for i, (emotions, primary_emotion) in enumerate(batch_results, start):
+            # Convert predictions to binary format (unmapped columns score 0)
+            emo_vec = np.fromiter(
+                (emotions.get(emotion, 0.0) for emotion in col_emotion),
+                dtype=np.float32,
+                count=len(col_emotion)
+            )
+            all_preds[i] = emo_vec > 0.5
+        
+        # Print progress
+        print(f"Processed {start + len(batch)}/{len(texts)} examples")
     
     # Calculate metrics
     accuracy = accuracy_score(all_labels, all_preds)
@@ -143,6 +140,8 @@ def main():
                         help="Path to the test data")
     parser.add_argument("--sample_size", type=int, default=100,
                         help="Number of examples to sample for evaluation")
+    parser.add_argument("--batch_size", type=int, default=32,
+                        help="Number of texts sent to the emotion service per batch")
     parser.add_argument("--output", type=str, default="data/evaluation/backend_results.json",
                         help="Path to save the evaluation results")
     args = parser.parse_args()
@@ -167,7 +166,8 @@ def main():
         labels, 
         label_cols, 
         emotion_labels, 
-        args.sample_size
+        args.sample_size,
+        args.batch_size
     )
     
     # Print results
@@ -13,8 +13,12 @@ def check_model_format(model_path):
         return
     
     try:
-        with open(model_path, 'rb') as f:
-            model_data = pickle.load(f)
+        try:
+            # Tensors land on the meta device: shapes and dtypes without storage
+            model_data = torch.load(model_path, map_location='meta', weights_only=True)
+        except Exception:
+            with open(model_path, 'rb') as f:
+                model_data = pickle.load(f)
         
         print(f"Model data type: {type(model_data)}")
         
@@ -22,9 +26,12 @@ def check_model_format(model_path):
             print(f"Number of keys: {len(model_data)}")
             print("Sample keys:")
             for i, key in enumerate(list(model_data.keys())[:10]):
-                print(f"  {key}: {type(model_data[key])}")
-                if isinstance(model_data[key], (np.ndarray, list)):
-                    print(f"    Shape: {np.array(model_data[key]).shape}")
+                value = model_data[key]
+                print(f"  {key}: {type(value)}")
+                if isinstance(value, torch.Tensor):
+                    print(f"    Shape: {tuple(value.shape)}, dtype: {value.dtype}")
+                elif isinstance(value, (np.ndarray, list)):
+                    print(f"    Shape: {np.array(value).shape}")
         else:
             print(f"Model data is not a dictionary. Cannot inspect keys.")
     
@@ -0,0 +1,64 @@
+import pickle
+import os
+import argparse
+import torch
+from safetensors.torch import load_file, save_file
+
+def safetensors_path(model_path):
+    """Path of the safetensors copy that sits next to a .pkl checkpoint."""
+    root, _ = os.path.splitext(str(model_path))
+    return root + ".safetensors"
+
+def state_dict_source(model_path):
+    """File a state dict will actually be read from: the safetensors copy when present."""
+    converted = safetensors_path(model_path)
+    return converted if os.path.exists(converted) else str(model_path)
+
+def load_state_dict_file(model_path, device="cpu"):
+    """Load a state dict without first materializing a pickled copy on the heap.
+
+    Prefers the safetensors copy, then torch.load with mmap (zip-format
+    checkpoints), and only falls back to plain pickle for legacy files.
+    """
+    source = state_dict_source(model_path)
+    if source.endswith(".safetensors"):
+        return load_file(source, device=str(device))
+    try:
+        return torch.load(source, map_location=device, mmap=True, weights_only=True)
+    except Exception:
+        with open(source, 'rb') as f:
+            return pickle.load(f)
+
+def convert(model_path):
+    """Write a safetensors copy of a pickled state dict."""
+    with open(model_path, 'rb') as f:
+        model_state = pickle.load(f)
+
+    if not isinstance(model_state, dict):
+        print(f"{model_path} does not contain a state dictionary")
+        return None
+
+    tensors = {
+        key: (value if isinstance(value, torch.Tensor) else torch.tensor(value)).contiguous()
+        for key, value in model_state.items()
+    }
+    output_path = safetensors_path(model_path)
+    save_file(tensors, output_path)
+    return output_path
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert a pickled model state dict to safetensors")
+    parser.add_argument("--model_path", type=str, default="data/processed/emotion_model.pkl",
+                        help="Path to the pickled state dict")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.model_path):
+        print(f"Model file not found at {args.model_path}")
+        return
+
+    output_path = convert(args.model_path)
+    if output_path:
+        print(f"Safetensors model saved to {output_path}")
+
+if __name__ == "__main__":
+    main()
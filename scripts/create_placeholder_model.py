@@ -27,9 +27,10 @@ model = AutoModelForSequenceClassification.from_pretrained(
 # Create a placeholder trained model by slightly modifying the base model weights
 # This simulates a trained model without actually training it
 print("Creating placeholder trained model...")
-for param in model.parameters():
-    # Add small random values to the parameters to simulate training
-    param.data = param.data + 0.01 * torch.randn_like(param.data)
+with torch.no_grad():
+    for param in model.parameters():
+        # Add small random values to the parameters in place to simulate training
+        param.add_(torch.randn_like(param), alpha=0.01)
 
 # Save the model state dictionary
 print("Saving the placeholder model...")
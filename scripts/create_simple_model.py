@@ -1,7 +1,7 @@
 import pickle
 import os
 from pathlib import Path
-import random
+import numpy as np
 
 # Create directories if they don't exist
 os.makedirs("data/processed", exist_ok=True)
@@ -21,15 +21,11 @@ print("Creating simple model state dictionary...")
 model_state = {}
 
 # Add some random parameters to simulate a model state dictionary
+rng = np.random.default_rng()
 for i in range(10):
-    param_name = f"layer_{i}.weight"
-    # Create a small random array
-    param_value = [[random.random() for _ in range(5)] for _ in range(5)]
-    model_state[param_name] = param_value
-
-    param_name = f"layer_{i}.bias"
-    param_value = [random.random() for _ in range(5)]
-    model_state[param_name] = param_value
+    # Small random arrays, stored as plain lists
+    model_state[f"layer_{i}.weight"] = rng.random((5, 5)).tolist()
+    model_state[f"layer_{i}.bias"] = rng.random(5).tolist()
 
 # Save the model state dictionary
 print("Saving the simple model...")
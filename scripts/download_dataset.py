@@ -1,16 +1,30 @@
 import os
+import shutil
 import requests
-import pandas as pd
 from pathlib import Path
 
-def download_file(url: str, output_path: str):
-    """Download a file from a URL."""
-    response = requests.get(url, stream=True)
-    response.raise_for_status()
+# 1 MiB reads keep the number of write syscalls low for the ~100 MB files
+DOWNLOAD_CHUNK_SIZE = 1 << 20
+
+def download_file(url: str, output, skip_header: bool = False) -> bool:
+    """Stream a file from a URL into an open binary file.
+
+    With skip_header the first line (the CSV header) is dropped. Returns
+    whether the data written ended with a newline; output must be opened
+    for reading as well so the last byte can be checked.
+    """
+    with requests.get(url, stream=True) as response:
+        response.raise_for_status()
+        response.raw.decode_content = True
+        if skip_header:
+            response.raw.readline()
+        start = output.tell()
+        shutil.copyfileobj(response.raw, output, length=DOWNLOAD_CHUNK_SIZE)
     
-    with open(output_path, 'wb') as f:
-        for chunk in response.iter_content(chunk_size=8192):
-            f.write(chunk)
+    if output.tell() == start:
+        return True
+    output.seek(-1, os.SEEK_CUR)
+    return output.read(1) == b'\n'
 
 def main():
     # Create necessary directories
@@ -25,29 +39,16 @@ def main():
         "goemotions_3.csv"
     ]
 
-    # Download and combine datasets
-    dfs = []
-    for file in files:
-        url = f"{base_url}/{file}"
-        output_path = data_dir / file
-        print(f"Downloading {file}...")
-        download_file(url, output_path)
-        
-        # Read the CSV file
-        df = pd.read_csv(output_path)
-        dfs.append(df)
-
-    # Combine all dataframes
-    combined_df = pd.concat(dfs, ignore_index=True)
-    
-    # Save the combined dataset
+    # Download and combine datasets: the parts share one header, so they are
+    # appended straight into the combined file, keeping only the first header
     output_file = data_dir / "goemotions.csv"
-    combined_df.to_csv(output_file, index=False)
+    with open(output_file, 'w+b') as output:
+        for i, file in enumerate(files):
+            url = f"{base_url}/{file}"
+            print(f"Downloading {file}...")
+            if not download_file(url, output, skip_header=i > 0):
+                output.write(b'\n')
     print(f"Combined dataset saved to {output_file}")
 
-    # Clean up individual files
-    for file in files:
-        (data_dir / file).unlink()
-
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
@@ -1,12 +1,32 @@
 import streamlit as st
 import torch
-import pickle
+import hashlib
 import os
+import re
+import shutil
+import tempfile
+import threading
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
+import pandas as pd
+import altair as alt
+from itertools import islice
 from pathlib import Path
 from transformers import AutoTokenizer, AutoModelForSequenceClassification
+from convert_pkl_to_safetensors import load_state_dict_file, state_dict_source
+
+try:
+    import onnxruntime as ort
+except ImportError:
+    ort = None  # PyTorch eager inference is used instead
+
+# Longest input accepted by preprocess_text
+MAX_LENGTH = 512
+
+# Padded input lengths with a captured CUDA graph for single-text inference
+CUDA_GRAPH_BUCKETS = (32, 64, 128, 256, MAX_LENGTH)
+
+# Exported ONNX graphs, one per set of weights
+ONNX_CACHE_DIR = Path("data/processed/onnx")
 
 # Define emotion labels
 emotion_labels = [
@@ -16,6 +36,22 @@ emotion_labels = [
     "caring", "excitement", "surprise", "disgust", "desire", "fear",
     "remorse", "embarrassment", "nervousness", "pride", "relief", "grief"
 ]
+emotion_labels_arr = np.asarray(emotion_labels)
+
+@st.cache_resource(show_spinner=False)
+def get_tokenizer(model_name):
+    """Load a tokenizer once and share it across reruns and sessions."""
+    return AutoTokenizer.from_pretrained(model_name)
+
+def load_classifier(name_or_path, **kwargs):
+    """Load a sequence classifier, using fused SDPA attention where supported."""
+    try:
+        return AutoModelForSequenceClassification.from_pretrained(
+            name_or_path, attn_implementation="sdpa", **kwargs
+        )
+    except (TypeError, ValueError, ImportError):
+        # Older transformers/torch without SDPA support for this model
+        return AutoModelForSequenceClassification.from_pretrained(name_or_path, **kwargs)
 
 class EmotionModel:
     def __init__(self, model_path=None, full_model_path=None):
@@ -24,23 +60,37 @@ class EmotionModel:
         self.full_model_path = full_model_path or "models/emotion_detector"
         self.tokenizer = None
         self.model = None
+        self.session = None
+        self.traced_model = None  # frozen TorchScript graph for the PyTorch path
+        self.cuda_graphs = {}  # bucket length -> (graph, input_ids, attention_mask, logits)
+        self.weights_path = None  # file the weights were loaded from, keys the ONNX cache
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
         
+        # Reused input buffers on CUDA, so predict does not allocate per call. The model is
+        # shared by every Streamlit session, so they are only touched under _device_lock
+        self._device_lock = threading.Lock()
+        self._ids_pinned = self._mask_pinned = None
+        self._ids_gpu = self._mask_gpu = None
+        if self.device.type == "cuda":
+            self._ids_gpu = torch.empty((1, MAX_LENGTH), dtype=torch.long, device=self.device)
+            self._mask_gpu = torch.empty_like(self._ids_gpu)
+            self._ids_pinned = torch.empty((1, MAX_LENGTH), dtype=torch.long).pin_memory()
+            self._mask_pinned = torch.empty_like(self._ids_pinned).pin_memory()
+        
         self._load_model()
     
     def _load_model(self):
         """Load the pre-trained model and tokenizer."""
         try:
             # Initialize tokenizer
-            self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+            self.tokenizer = get_tokenizer(self.model_name)
             
             # Try loading from full model path first
             if os.path.exists(self.full_model_path):
                 try:
                     st.info(f"Loading full model from {self.full_model_path}")
-                    self.model = AutoModelForSequenceClassification.from_pretrained(
-                        self.full_model_path
-                    )
+                    self.model = load_classifier(self.full_model_path)
+                    self.weights_path = self.full_model_path
                     st.success("Successfully loaded full model")
                 except Exception as e:
                     st.warning(f"Error loading full model: {e}")
@@ -53,7 +103,26 @@ class EmotionModel:
             if self.model:
                 self.model.to(self.device)
                 self.model.eval()
-                st.success(f"Model loaded and ready for inference on {self.device}")
+                if self.device.type == "cuda":
+                    # FP16 weights and activations on GPU; logits are cast back in predict
+                    self.model.half()
+                self._load_onnx_session()
+                if self.session is None:
+                    if self.device.type == "cpu":
+                        # int8 weights for every Linear layer (FBGEMM kernels on x86)
+                        self.model = torch.ao.quantization.quantize_dynamic(
+                            self.model, {torch.nn.Linear}, dtype=torch.qint8
+                        )
+                    self._trace_model()
+                    if self.device.type == "cuda":
+                        self._capture_cuda_graphs()
+                if self.session:
+                    backend = "ONNX Runtime"
+                elif self.cuda_graphs:
+                    backend = "CUDA Graphs"
+                else:
+                    backend = "TorchScript" if self.traced_model is not None else "PyTorch"
+                st.success(f"Model loaded and ready for inference on {self.device} ({backend})")
             
         except Exception as e:
             st.error(f"Error in _load_model: {e}")
@@ -64,7 +133,7 @@ class EmotionModel:
         """Load model from state dictionary."""
         try:
             # Initialize model
-            self.model = AutoModelForSequenceClassification.from_pretrained(
+            self.model = load_classifier(
                 self.model_name,
                 num_labels=len(emotion_labels),
                 problem_type="multi_label_classification"
@@ -74,14 +143,14 @@ class EmotionModel:
             model_path = Path(self.model_path)
             if os.path.exists(model_path):
                 try:
-                    st.info(f"Loading fine-tuned model from {model_path}")
-                    with open(model_path, 'rb') as f:
-                        model_state = pickle.load(f)
-                        if isinstance(model_state, dict):
-                            self.model.load_state_dict(model_state)
-                            st.success("Successfully loaded fine-tuned model weights")
-                        else:
-                            st.warning("Model file does not contain valid state dictionary")
+                    st.info(f"Loading fine-tuned model from {state_dict_source(model_path)}")
+                    model_state = load_state_dict_file(model_path)
+                    if isinstance(model_state, dict):
+                        self.model.load_state_dict(model_state)
+                        self.weights_path = state_dict_source(model_path)
+                        st.success("Successfully loaded fine-tuned model weights")
+                    else:
+                        st.warning("Model file does not contain valid state dictionary")
                 except Exception as e:
                     st.warning(f"Error loading fine-tuned model: {e}")
                     st.info("Using base model instead")
@@ -91,94 +160,270 @@ class EmotionModel:
             st.error(f"Error in _load_from_state_dict: {e}")
             self.model = None
     
+    def _onnx_path(self):
+        """ONNX file for the loaded weights on this device and dtype.
+        
+        Keyed by the path, size and mtime of every weight file, so a model directory
+        rewritten in place by save_pretrained gets a new export.
+        """
+        key = [self.model_name, self.device.type, str(self.model.dtype)]
+        if self.weights_path and os.path.exists(self.weights_path):
+            weights = Path(self.weights_path)
+            files = sorted(p for p in weights.rglob("*") if p.is_file()) if weights.is_dir() else [weights]
+            for path in files:
+                stat = path.stat()
+                key.append(f"{path.resolve()}:{stat.st_size}:{stat.st_mtime_ns}")
+        digest = hashlib.md5("|".join(key).encode()).hexdigest()[:12]
+        return ONNX_CACHE_DIR / f"emotion_{digest}.onnx"
+    
+    def _load_onnx_session(self):
+        """Export the model to ONNX (once per weights) and open an ONNX Runtime session."""
+        if ort is None:
+            return
+        try:
+            onnx_path = self._onnx_path()
+            if not onnx_path.exists():
+                ONNX_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+                dummy = self.tokenizer("export", return_tensors="pt").to(self.device)
+                # Export into a scratch directory and move the result into place, so a
+                # failed export never leaves a partial graph under the cached name.
+                # Newer exporters write weights to a sidecar named after the graph file
+                tmp_dir = tempfile.mkdtemp(dir=ONNX_CACHE_DIR)
+                try:
+                    tmp_path = os.path.join(tmp_dir, onnx_path.name)
+                    torch.onnx.export(
+                        self.model,
+                        (dummy["input_ids"], dummy["attention_mask"]),
+                        tmp_path,
+                        opset_version=14,
+                        input_names=["input_ids", "attention_mask"],
+                        output_names=["logits"],
+                        dynamic_axes={
+                            "input_ids": {0: "batch", 1: "sequence"},
+                            "attention_mask": {0: "batch", 1: "sequence"},
+                            "logits": {0: "batch"}
+                        }
+                    )
+                    # Sidecars first; the graph file appearing marks the entry complete
+                    for name in sorted(os.listdir(tmp_dir), key=lambda name: name == onnx_path.name):
+                        os.replace(os.path.join(tmp_dir, name), ONNX_CACHE_DIR / name)
+                finally:
+                    shutil.rmtree(tmp_dir, ignore_errors=True)
+            
+            options = ort.SessionOptions()
+            options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+            providers = [
+                provider for provider in ("CUDAExecutionProvider", "CPUExecutionProvider")
+                if provider in ort.get_available_providers()
+            ]
+            self.session = ort.InferenceSession(str(onnx_path), options, providers=providers)
+        except Exception as e:
+            st.warning(f"ONNX Runtime unavailable, using PyTorch: {e}")
+            self.session = None
+    
+    def _trace_model(self):
+        """Trace, freeze and optimize the model for TorchScript inference."""
+        try:
+            dummy = torch.ones(1, 32, dtype=torch.long, device=self.device)
+            with torch.no_grad():
+                traced = torch.jit.trace(self.model, (dummy, dummy), strict=False)
+                traced = torch.jit.optimize_for_inference(torch.jit.freeze(traced.eval()))
+                # Warm up with short and long inputs so the first requests do not pay for specialization
+                for length in (16, 128):
+                    warmup = torch.ones(1, length, dtype=torch.long, device=self.device)
+                    traced(warmup, warmup)
+            self.traced_model = traced
+        except Exception as e:
+            st.warning(f"TorchScript tracing failed, using eager PyTorch: {e}")
+            self.traced_model = None
+    
     def preprocess_text(self, text):
         """Preprocess the input text for the model."""
         inputs = self.tokenizer(
             text,
             padding=True,
             truncation=True,
-            max_length=512,
+            max_length=MAX_LENGTH,
             return_tensors="pt"
         )
         return inputs
     
-    def predict(self, text):
-        """Predict emotions for the given text."""
-        if not self.model or not self.tokenizer:
-            st.error("Model or tokenizer not loaded properly")
-            return None, None
-        
-        # Preprocess text
-        inputs = self.preprocess_text(text)
-        inputs = {k: v.to(self.device) for k, v in inputs.items()}
-        
-        # Get predictions
-        with torch.no_grad():
-            outputs = self.model(**inputs)
-            logits = outputs.logits
-        
-        # Convert logits to probabilities
-        probs = torch.sigmoid(logits)[0].cpu().numpy()
+    def _capture_cuda_graphs(self):
+        """Capture one CUDA graph per bucket length for single-text inference."""
+        graphs = {}
+        try:
+            with torch.no_grad():
+                for bucket in CUDA_GRAPH_BUCKETS:
+                    # Static buffers, created outside inference mode so predict can copy into them
+                    input_ids = torch.full(
+                        (1, bucket), self.tokenizer.pad_token_id, dtype=torch.long, device=self.device
+                    )
+                    attention_mask = torch.ones_like(input_ids)
+                    
+                    # Warm up on a side stream before capturing, as CUDA graphs require
+                    stream = torch.cuda.Stream()
+                    stream.wait_stream(torch.cuda.current_stream())
+                    with torch.cuda.stream(stream):
+                        for _ in range(3):
+                            self._forward(input_ids, attention_mask)
+                    torch.cuda.current_stream().wait_stream(stream)
+                    
+                    graph = torch.cuda.CUDAGraph()
+                    with torch.cuda.graph(graph):
+                        logits = self._forward(input_ids, attention_mask)
+                    graphs[bucket] = (graph, input_ids, attention_mask, logits)
+            self.cuda_graphs = graphs
+        except Exception as e:
+            st.warning(f"CUDA graph capture failed, launching kernels per call: {e}")
+            self.cuda_graphs = {}
+    
+    def _forward(self, input_ids, attention_mask):
+        """Logits from the traced graph when available, otherwise the eager model."""
+        if self.traced_model is not None:
+            return self.traced_model(input_ids, attention_mask)["logits"]
+        return self.model(input_ids=input_ids, attention_mask=attention_mask).logits
+    
+    def _to_device(self, inputs, ids_buf=None, mask_buf=None):
+        """Move tokenized inputs to the device, through the preallocated buffers on CUDA.
         
-        # Create emotions dictionary with probabilities
-        emotions = {
-            emotion_labels[i]: float(prob)
-            for i, prob in enumerate(probs)
-            if prob > 0.05  # Only include emotions with significant probability
-        }
+        ids_buf/mask_buf may be longer than the input; their tail is filled as padding.
+        """
+        input_ids, attention_mask = inputs["input_ids"], inputs["attention_mask"]
+        if self._ids_gpu is None or input_ids.shape[0] != 1:
+            return input_ids.to(self.device), attention_mask.to(self.device)
         
-        # Sort emotions by probability
-        emotions = dict(sorted(emotions.items(), key=lambda x: x[1], reverse=True))
+        length = input_ids.shape[1]
+        if ids_buf is None:
+            ids_buf, mask_buf = self._ids_gpu[:, :length], self._mask_gpu[:, :length]
+        else:
+            ids_buf[:, length:].fill_(self.tokenizer.pad_token_id)
+            mask_buf[:, length:].zero_()
+        self._ids_pinned[:, :length].copy_(input_ids)
+        self._mask_pinned[:, :length].copy_(attention_mask)
+        ids_buf[:, :length].copy_(self._ids_pinned[:, :length], non_blocking=True)
+        mask_buf[:, :length].copy_(self._mask_pinned[:, :length], non_blocking=True)
+        return ids_buf, mask_buf
+    
+    def _predict_probs(self, inputs):
+        """Run a tokenized batch through the active backend; returns (batch, labels) probabilities."""
+        if self.session is not None:
+            logits = self.session.run(None, {
+                "input_ids": inputs["input_ids"].numpy(),
+                "attention_mask": inputs["attention_mask"].numpy()
+            })[0]
+            logits = torch.from_numpy(logits)
+            return torch.sigmoid(logits.float()).numpy()
         
-        # Get primary emotion (highest probability)
-        primary_emotion = emotion_labels[np.argmax(probs)]
+        batch_size, length = inputs["input_ids"].shape
+        bucket = next((b for b in CUDA_GRAPH_BUCKETS if b >= length), None)
+        # Held until the logits are on the host: the input buffers and the graphs'
+        # static inputs and logits are shared by every session
+        with self._device_lock:
+            if batch_size == 1 and bucket in self.cuda_graphs:
+                # Copy into the captured graph's static inputs and replay it
+                graph, ids_buf, mask_buf, logits = self.cuda_graphs[bucket]
+                self._to_device(inputs, ids_buf, mask_buf)
+                graph.replay()
+            else:
+                input_ids, attention_mask = self._to_device(inputs)
+                with torch.inference_mode():
+                    logits = self._forward(input_ids, attention_mask)
+            
+            # Convert logits to probabilities
+            return torch.sigmoid(logits.float()).cpu().numpy()
+    
+    def predict_many(self, texts, batch_size=8):
+        """Yield (emotions, primary_emotion) for each text, running the model in batches."""
+        if not self.model or not self.tokenizer:
+            st.error("Model or tokenizer not loaded properly")
+            return
         
-        return emotions, primary_emotion
+        texts = iter(texts)
+        while True:
+            batch = list(islice(texts, batch_size))
+            if not batch:
+                return
+            
+            # Each batch is padded to its own longest text
+            for probs in self._predict_probs(self.preprocess_text(batch)):
+                # Emotions with significant probability, highest first
+                idx = np.nonzero(probs > 0.05)[0]
+                order = idx[np.argsort(-probs[idx], kind="stable")]
+                emotions = dict(zip(emotion_labels_arr[order].tolist(), probs[order].tolist()))
+                
+                # Get primary emotion (highest probability)
+                primary_emotion = emotion_labels[int(probs.argmax())]
+                
+                yield emotions, primary_emotion
+    
+    def predict(self, text):
+        """Predict emotions for the given text."""
+        return next(self.predict_many([text]), (None, None))
 
 def plot_emotions(emotions):
-    """Plot emotions as a bar chart."""
+    """Build a bar chart of the top emotions, drawn natively by the browser."""
     # Sort emotions by value
     sorted_emotions = sorted(emotions.items(), key=lambda x: x[1], reverse=True)
     labels, values = zip(*sorted_emotions[:10])  # Show top 10 emotions
+    df = pd.DataFrame({"emotion": labels, "probability": values})
     
-    fig, ax = plt.subplots(figsize=(10, 6))
-    bars = ax.bar(labels, values, color='skyblue')
-    
+    # sort=None keeps the highest-probability emotion first instead of alphabetical order
+    bars = alt.Chart(df).mark_bar(color='skyblue').encode(
+        x=alt.X("emotion", sort=None, title="Emotions", axis=alt.Axis(labelAngle=-45)),
+        y=alt.Y("probability", title="Probability")
+    )
     # Add value labels on top of bars
-    for bar in bars:
-        height = bar.get_height()
-        ax.text(bar.get_x() + bar.get_width()/2., height + 0.01,
-                f'{height:.2f}', ha='center', va='bottom')
-    
-    plt.title('Emotion Probabilities')
-    plt.xlabel('Emotions')
-    plt.ylabel('Probability')
-    plt.xticks(rotation=45, ha='right')
-    plt.tight_layout()
+    text = bars.mark_text(dy=-6).encode(text=alt.Text("probability", format=".2f"))
     
-    return fig
+    return (bars + text).properties(title="Emotion Probabilities")
+
+# Emotion-specific summaries
+_EMOTION_INSIGHTS = {
+    "joy": "Your joy radiates through your words. This positive emotion is associated with happiness, satisfaction, and pleasure.",
+    "sadness": "Your sadness is reflected in your words. This emotion often arises from loss, disappointment, or feeling down.",
+    "fear": "Your text suggests feelings of fear or anxiety. This emotion is a response to perceived threats or uncertainty.",
+    "anger": "Your words express anger. This emotion often stems from feeling wronged, frustrated, or threatened.",
+    "optimism": "Your text conveys optimism. This forward-looking emotion focuses on positive outcomes and possibilities.",
+    "disappointment": "Your words suggest disappointment. This emotion often follows unmet expectations or hopes.",
+    "gratitude": "Your text expresses gratitude. This emotion acknowledges appreciation for something or someone.",
+    "caring": "Your words show caring and compassion. This emotion reflects concern for others' wellbeing."
+}
+
+# Default insight if specific emotion not found
+_DEFAULT_INSIGHT = "Your text shows a complex emotional state. Emotions are nuanced and can be influenced by many factors."
 
 def get_emotion_summary(primary_emotion, emotions):
     """Generate a summary based on the detected emotions."""
-    # Emotion-specific summaries
-    emotion_insights = {
-        "joy": "Your joy radiates through your words. This positive emotion is associated with happiness, satisfaction, and pleasure.",
-        "sadness": "Your sadness is reflected in your words. This emotion often arises from loss, disappointment, or feeling down.",
-        "fear": "Your text suggests feelings of fear or anxiety. This emotion is a response to perceived threats or uncertainty.",
-        "anger": "Your words express anger. This emotion often stems from feeling wronged, frustrated, or threatened.",
-        "optimism": "Your text conveys optimism. This forward-looking emotion focuses on positive outcomes and possibilities.",
-        "disappointment": "Your words suggest disappointment. This emotion often follows unmet expectations or hopes.",
-        "gratitude": "Your text expresses gratitude. This emotion acknowledges appreciation for something or someone.",
-        "caring": "Your words show caring and compassion. This emotion reflects concern for others' wellbeing."
-    }
-    
-    # Default insight if specific emotion not found
-    default_insight = "Your text shows a complex emotional state. Emotions are nuanced and can be influenced by many factors."
+    return _EMOTION_INSIGHTS.get(primary_emotion, _DEFAULT_INSIGHT)
+
+def split_paragraphs(text):
+    """Split text on blank lines into the non-empty paragraphs analyzed as one batch."""
+    return [paragraph.strip() for paragraph in re.split(r"\n\s*\n", text) if paragraph.strip()]
+
+def render_analysis(emotions, primary_emotion):
+    """Show the primary emotion, summary, top emotions and chart for one text."""
+    # Two columns layout
+    col1, col2 = st.columns([1, 1])
     
-    # Build the summary
-    summary = emotion_insights.get(primary_emotion, default_insight)
+    with col1:
+        st.subheader("Primary Emotion")
+        st.markdown(f"### {primary_emotion.capitalize()}")
+        
+        st.subheader("Emotion Summary")
+        st.write(get_emotion_summary(primary_emotion, emotions))
+        
+        st.subheader("Top Emotions")
+        for emotion, prob in list(emotions.items())[:5]:
+            st.write(f"**{emotion.capitalize()}**: {prob:.4f}")
     
-    return summary
+    with col2:
+        st.subheader("Emotion Distribution")
+        st.altair_chart(plot_emotions(emotions), use_container_width=True)
+
+@st.cache_resource(show_spinner=False)
+def get_emotion_model(model_path, full_model_path):
+    """Build the model once per pair of paths instead of on every rerun."""
+    return EmotionModel(model_path, full_model_path)
 
 def main():
     st.set_page_config(
@@ -203,7 +448,7 @@ def main():
     
     # Initialize model
     with st.spinner("Loading model..."):
-        model = EmotionModel(model_path, full_model_path)
+        model = get_emotion_model(model_path, full_model_path)
     
     # Text input
     st.header("Enter Text")
@@ -223,11 +468,15 @@ def main():
         "Surprised": "Wow! I didn't expect that at all. This is such an unexpected turn of events."
     }
     
-    cols = st.columns(len(sample_texts))
+    cols = st.columns(len(sample_texts) + 1)
     for i, (emotion, text) in enumerate(sample_texts.items()):
         if cols[i].button(emotion):
             text_input = text
             st.session_state.text_input = text
+    if cols[-1].button("All samples"):
+        # One paragraph per sample, analyzed together in a single batch
+        text_input = "\n\n".join(sample_texts.values())
+        st.session_state.text_input = text_input
     
     # Store text input in session state
     if 'text_input' not in st.session_state:
@@ -240,31 +489,22 @@ def main():
         if not st.session_state.text_input:
             st.warning("Please enter some text to analyze.")
         else:
+            # Each paragraph is analyzed separately, all of them in batched forward passes
+            paragraphs = split_paragraphs(st.session_state.text_input)
             with st.spinner("Analyzing emotions..."):
-                emotions, primary_emotion = model.predict(st.session_state.text_input)
+                results = list(model.predict_many(paragraphs))
             
-            if emotions and primary_emotion:
+            if results and all(emotions and primary_emotion for emotions, primary_emotion in results):
                 # Display results
                 st.header("Analysis Results")
                 
-                # Two columns layout
-                col1, col2 = st.columns([1, 1])
-                
-                with col1:
-                    st.subheader("Primary Emotion")
-                    st.markdown(f"### {primary_emotion.capitalize()}")
-                    
-                    st.subheader("Emotion Summary")
-                    st.write(get_emotion_summary(primary_emotion, emotions))
-                    
-                    st.subheader("Top Emotions")
-                    for emotion, prob in list(emotions.items())[:5]:
-                        st.write(f"**{emotion.capitalize()}**: {prob:.4f}")
-                
-                with col2:
-                    st.subheader("Emotion Distribution")
-                    fig = plot_emotions(emotions)
-                    st.pyplot(fig)
+                if len(results) == 1:
+                    render_analysis(*results[0])
+                else:
+                    for i, (paragraph, (emotions, primary_emotion)) in enumerate(zip(paragraphs, results), 1):
+                        st.subheader(f"Paragraph {i}")
+                        st.caption(paragraph)
+                        render_analysis(emotions, primary_emotion)
             else:
                 st.error("Failed to analyze emotions. Please try again.")
 
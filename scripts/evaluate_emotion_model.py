@@ -2,17 +2,19 @@ import torch
 import torch.nn as nn
 from torch.utils.data import Dataset, DataLoader
 from transformers import AutoTokenizer, AutoModelForSequenceClassification
+from convert_pkl_to_safetensors import load_state_dict_file, state_dict_source
 import pandas as pd
 import numpy as np
 import pickle
 import os
-import json
+import orjson
 from pathlib import Path
-from sklearn.metrics import accuracy_score, f1_score, precision_score, recall_score, confusion_matrix
-import matplotlib.pyplot as plt
-import seaborn as sns
+import matplotlib
+matplotlib.use("Agg")  # Files only; skip interactive backend probing
+from matplotlib.figure import Figure
 from tqdm import tqdm
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 
 # Define emotion labels
 emotion_labels = [
@@ -37,40 +39,49 @@ config = {
 # Custom dataset class
 class EmotionDataset(Dataset):
     def __init__(self, texts, labels, tokenizer, max_length):
-        self.texts = texts
-        self.labels = labels
-        self.tokenizer = tokenizer
-        self.max_length = max_length
+        assert tokenizer.is_fast, "EmotionDataset expects a fast (Rust) tokenizer"
+        # Tokenize the whole corpus in one call; batches are padded by collate_fn
+        encodings = tokenizer(list(texts), padding=False, truncation=True, max_length=max_length)
+        self.input_ids = [np.asarray(ids, dtype=np.int32) for ids in encodings["input_ids"]]
+        self.attention_mask = [np.asarray(mask, dtype=np.int32) for mask in encodings["attention_mask"]]
+        self.pad_token_id = tokenizer.pad_token_id
+        
+        self.labels = None
+        if labels is not None:
+            self.labels = np.asarray(labels, dtype=np.float32)
+            if self.labels.ndim == 1:
+                # One value per text
+                self.labels = self.labels[:, None]
         
     def __len__(self):
-        return len(self.texts)
+        return len(self.input_ids)
     
     def __getitem__(self, idx):
-        text = self.texts[idx]
-        label = self.labels[idx] if self.labels is not None else None
-        
-        encoding = self.tokenizer(
-            text,
-            max_length=self.max_length,
-            padding="max_length",
-            truncation=True,
-            return_tensors="pt"
-        )
-        
-        # Remove batch dimension
-        item = {key: val.squeeze(0) for key, val in encoding.items()}
-        
-        if label is not None:
-            # Convert label to a format that can be converted to a torch tensor
-            if isinstance(label, (list, np.ndarray)):
-                # Ensure the label is a flat array of floats
-                label_array = np.array(label, dtype=np.float32)
-                item["labels"] = torch.tensor(label_array, dtype=torch.float)
-            else:
-                # If it's a single value
-                item["labels"] = torch.tensor([float(label)], dtype=torch.float)
-            
+        item = {
+            "input_ids": self.input_ids[idx],
+            "attention_mask": self.attention_mask[idx]
+        }
+        if self.labels is not None:
+            item["labels"] = self.labels[idx]
         return item
+    
+    def collate_fn(self, items):
+        """Pad a list of items to the longest sequence in the batch."""
+        max_len = max(len(item["input_ids"]) for item in items)
+        input_ids = np.full((len(items), max_len), self.pad_token_id, dtype=np.int64)
+        attention_mask = np.zeros((len(items), max_len), dtype=np.int64)
+        for row, item in enumerate(items):
+            n = len(item["input_ids"])
+            input_ids[row, :n] = item["input_ids"]
+            attention_mask[row, :n] = item["attention_mask"]
+        
+        batch = {
+            "input_ids": torch.from_numpy(input_ids),
+            "attention_mask": torch.from_numpy(attention_mask)
+        }
+        if "labels" in items[0]:
+            batch["labels"] = torch.from_numpy(np.stack([item["labels"] for item in items]))
+        return batch
 
 def load_test_data(path):
     """Load test data from pickle file or CSV."""
@@ -136,13 +147,23 @@ def load_test_data(path):
         print(f"Unsupported file format: {path}")
         return None, None
 
+def load_classifier(name_or_path, **kwargs):
+    """Load a sequence classifier, using fused SDPA attention where supported."""
+    try:
+        return AutoModelForSequenceClassification.from_pretrained(
+            name_or_path, attn_implementation="sdpa", **kwargs
+        )
+    except (TypeError, ValueError, ImportError):
+        # Older transformers/torch without SDPA support for this model
+        return AutoModelForSequenceClassification.from_pretrained(name_or_path, **kwargs)
+
 def load_model(config):
     """Load the pre-trained model."""
     print("Loading model...")
     
     # Initialize model and tokenizer
-    tokenizer = AutoTokenizer.from_pretrained(config["model_name"])
-    model = AutoModelForSequenceClassification.from_pretrained(
+    tokenizer = AutoTokenizer.from_pretrained(config["model_name"], use_fast=True)
+    model = load_classifier(
         config["model_name"],
         num_labels=len(emotion_labels),
         problem_type="multi_label_classification"
@@ -152,14 +173,13 @@ def load_model(config):
     model_path = Path(config["model_path"])
     if os.path.exists(model_path):
         try:
-            print(f"Loading fine-tuned model from {model_path}")
-            with open(model_path, 'rb') as f:
-                model_state = pickle.load(f)
-                if isinstance(model_state, dict):
-                    model.load_state_dict(model_state)
-                    print("Successfully loaded fine-tuned model weights")
-                else:
-                    print("Warning: Model file does not contain valid state dictionary")
+            print(f"Loading fine-tuned model from {state_dict_source(model_path)}")
+            model_state = load_state_dict_file(model_path)
+            if isinstance(model_state, dict):
+                model.load_state_dict(model_state)
+                print("Successfully loaded fine-tuned model weights")
+            else:
+                print("Warning: Model file does not contain valid state dictionary")
         except Exception as e:
             print(f"Error loading fine-tuned model: {e}")
             print("Using base model instead")
@@ -169,7 +189,7 @@ def load_model(config):
         if os.path.exists(full_model_path):
             try:
                 print(f"Loading full model from {full_model_path}")
-                model = AutoModelForSequenceClassification.from_pretrained(full_model_path)
+                model = load_classifier(full_model_path)
                 print("Successfully loaded full model")
             except Exception as e:
                 print(f"Error loading full model: {e}")
@@ -179,40 +199,75 @@ def load_model(config):
     
     return model, tokenizer
 
-def evaluate_model(model, test_loader, device):
+def length_sorted_batches(dataset, batch_size):
+    """Split dataset indices into batches of similar token length.
+    
+    Sorting by length means each batch is only padded to its own longest
+    sequence by the dataset's collate_fn.
+    """
+    lengths = np.fromiter((len(ids) for ids in dataset.input_ids), dtype=np.int64, count=len(dataset))
+    order = np.argsort(lengths, kind="stable")
+    return [order[start:start + batch_size] for start in range(0, len(order), batch_size)]
+
+def evaluate_model(model, test_dataset, device, batch_size):
     """Evaluate the model on the test set."""
     print("Evaluating model...")
     
     model.eval()
-    all_preds = []
-    all_labels = []
+    all_labels = test_dataset.labels
+    # Batches arrive in length order; rows are written back at their original index
+    num_labels = model.config.num_labels
+    all_preds = np.empty((len(test_dataset), num_labels), dtype=np.uint8)
+    # Confusion matrix accumulated on the device as a flat (true * C + pred) histogram
+    cm = torch.zeros(num_labels * num_labels, dtype=torch.long, device=device)
+    # Rows whose predicted label set matches exactly (subset accuracy), counted on the device
+    exact_matches = torch.zeros((), dtype=torch.long, device=device)
+    batches = length_sorted_batches(test_dataset, batch_size)
+    # Workers collate batches while the model runs; pinned memory allows async copies to the GPU
+    num_workers = min(8, os.cpu_count() or 1)
+    test_loader = DataLoader(
+        test_dataset,
+        batch_sampler=batches,
+        collate_fn=test_dataset.collate_fn,
+        num_workers=num_workers,
+        pin_memory=device.type == "cuda",
+        persistent_workers=num_workers > 0
+    )
     
-    with torch.no_grad():
-        for batch in tqdm(test_loader, desc="Evaluating"):
-            batch = {k: v.to(device) for k, v in batch.items()}
-            labels = batch.pop("labels").cpu().numpy()
+    with torch.inference_mode():
+        for indices, batch in tqdm(zip(batches, test_loader), total=len(batches), desc="Evaluating"):
+            labels = batch.pop("labels").to(device, non_blocking=True)
+            batch = {k: v.to(device, non_blocking=True) for k, v in batch.items()}
             
             outputs = model(**batch)
             logits = outputs.logits
-            preds = torch.sigmoid(logits).cpu().numpy()
-            preds = (preds > 0.5).astype(int)
-            
-            all_preds.extend(preds)
-            all_labels.extend(labels)
+            preds = (torch.sigmoid(logits) > 0.5).to(torch.uint8)
+            all_preds[indices] = preds.cpu().numpy()
+            exact_matches += (preds == labels.to(torch.uint8)).all(dim=1).sum()
+            cm += torch.bincount(
+                labels.argmax(dim=1) * num_labels + preds.argmax(dim=1),
+                minlength=num_labels * num_labels
+            )
     
     # Calculate metrics
-    all_preds = np.array(all_preds)
-    all_labels = np.array(all_labels)
+    accuracy = exact_matches.item() / max(len(test_dataset), 1)
     
-    accuracy = accuracy_score(all_labels, all_preds)
-    f1 = f1_score(all_labels, all_preds, average='weighted', zero_division=0)
-    precision = precision_score(all_labels, all_preds, average='weighted', zero_division=0)
-    recall = recall_score(all_labels, all_preds, average='weighted', zero_division=0)
+    # Per-class metrics from one pass of TP/FP/FN counts (zero_division=0, as in sklearn)
+    y_true = all_labels.astype(bool)
+    y_pred = all_preds.astype(bool)
+    tp = (y_pred & y_true).sum(axis=0)
+    fp = (y_pred & ~y_true).sum(axis=0)
+    fn = (~y_pred & y_true).sum(axis=0)
+    per_class_precision = tp / np.maximum(tp + fp, 1)
+    per_class_recall = tp / np.maximum(tp + fn, 1)
+    per_class_f1 = 2 * tp / np.maximum(2 * tp + fp + fn, 1)
     
-    # Calculate per-class metrics
-    per_class_f1 = f1_score(all_labels, all_preds, average=None, zero_division=0)
-    per_class_precision = precision_score(all_labels, all_preds, average=None, zero_division=0)
-    per_class_recall = recall_score(all_labels, all_preds, average=None, zero_division=0)
+    # Support-weighted averages
+    support = tp + fn
+    weights = support / support.sum() if support.sum() else np.zeros_like(per_class_f1)
+    f1 = (per_class_f1 * weights).sum()
+    precision = (per_class_precision * weights).sum()
+    recall = (per_class_recall * weights).sum()
     
     # Create a dictionary of per-class metrics
     per_class_metrics = {
@@ -225,7 +280,7 @@ def evaluate_model(model, test_loader, device):
     }
     
     # Create confusion matrix
-    cm = confusion_matrix(all_labels.argmax(axis=1), all_preds.argmax(axis=1))
+    cm = cm.view(num_labels, num_labels).cpu().numpy()
     
     return {
         "accuracy": float(accuracy),
@@ -233,19 +288,28 @@ def evaluate_model(model, test_loader, device):
         "precision": float(precision),
         "recall": float(recall),
         "per_class_metrics": per_class_metrics,
-        "confusion_matrix": cm.tolist()
+        "confusion_matrix": cm
     }
 
 def plot_confusion_matrix(cm, output_path):
     """Plot and save confusion matrix."""
-    plt.figure(figsize=(12, 10))
-    sns.heatmap(cm, annot=True, fmt='d', cmap='Blues')
-    plt.title('Confusion Matrix')
-    plt.ylabel('True Label')
-    plt.xlabel('Predicted Label')
-    plt.tight_layout()
-    plt.savefig(output_path)
-    plt.close()
+    # A standalone Figure (not pyplot state), so plots can be rendered from worker threads
+    fig = Figure(figsize=(12, 10))
+    ax = fig.subplots()
+    image = ax.imshow(cm, cmap='Blues', aspect='auto')
+    fig.colorbar(image, ax=ax)
+    ax.set_xticks(np.arange(cm.shape[1]))
+    ax.set_yticks(np.arange(cm.shape[0]))
+    # Annotate each cell, in white on the darker half of the colour scale
+    threshold = cm.max() / 2 if cm.size else 0
+    for i, j in np.ndindex(cm.shape):
+        ax.text(j, i, str(cm[i, j]), ha='center', va='center',
+                color='white' if cm[i, j] > threshold else 'black')
+    ax.set_title('Confusion Matrix')
+    ax.set_ylabel('True Label')
+    ax.set_xlabel('Predicted Label')
+    fig.tight_layout()
+    fig.savefig(output_path)
 
 def plot_per_class_metrics(per_class_metrics, output_path):
     """Plot and save per-class metrics."""
@@ -254,22 +318,23 @@ def plot_per_class_metrics(per_class_metrics, output_path):
     precision_scores = [per_class_metrics[e]["precision"] for e in emotions]
     recall_scores = [per_class_metrics[e]["recall"] for e in emotions]
     
-    plt.figure(figsize=(15, 8))
+    fig = Figure(figsize=(15, 8))
+    ax = fig.subplots()
     x = np.arange(len(emotions))
     width = 0.25
     
-    plt.bar(x - width, f1_scores, width, label='F1')
-    plt.bar(x, precision_scores, width, label='Precision')
-    plt.bar(x + width, recall_scores, width, label='Recall')
+    ax.bar(x - width, f1_scores, width, label='F1')
+    ax.bar(x, precision_scores, width, label='Precision')
+    ax.bar(x + width, recall_scores, width, label='Recall')
     
-    plt.xlabel('Emotions')
-    plt.ylabel('Score')
-    plt.title('Per-Class Metrics')
-    plt.xticks(x, emotions, rotation=90)
-    plt.legend()
-    plt.tight_layout()
-    plt.savefig(output_path)
-    plt.close()
+    ax.set_xlabel('Emotions')
+    ax.set_ylabel('Score')
+    ax.set_title('Per-Class Metrics')
+    ax.set_xticks(x)
+    ax.set_xticklabels(emotions, rotation=90)
+    ax.legend()
+    fig.tight_layout()
+    fig.savefig(output_path)
 
 def main(args):
     # Update config with command line arguments
@@ -292,21 +357,23 @@ def main(args):
         print("Failed to load test data. Exiting.")
         return
     
-    # Create test dataset and dataloader
+    # Create test dataset (tokenized once, up front)
     test_dataset = EmotionDataset(texts, labels, tokenizer, config["max_length"])
-    test_loader = DataLoader(
-        test_dataset,
-        batch_size=config["batch_size"],
-        shuffle=False
-    )
     
     # Set device
     device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
     print(f"Using device: {device}")
     model.to(device)
+    if args.quantize:
+        if device.type == "cpu":
+            # int8 weights for every Linear layer; re-check per-class metrics against the FP32 run
+            model = torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+            print("Using dynamically quantized (int8) model")
+        else:
+            print("Dynamic quantization only applies on CPU; using the FP32 model")
     
     # Evaluate model
-    metrics = evaluate_model(model, test_loader, device)
+    metrics = evaluate_model(model, test_dataset, device, config["batch_size"])
     
     # Print metrics
     print("\nEvaluation Results:")
@@ -315,27 +382,32 @@ def main(args):
     print(f"Precision: {metrics['precision']:.4f}")
     print(f"Recall: {metrics['recall']:.4f}")
     
-    # Save metrics to file
-    metrics_path = os.path.join(config["output_dir"], "evaluation_metrics.json")
-    with open(metrics_path, 'w') as f:
-        json.dump(metrics, f, indent=2)
-    print(f"Metrics saved to {metrics_path}")
-    
-    # Plot and save confusion matrix
+    # Render both plots in worker threads while the metrics JSON is written
     cm_path = os.path.join(config["output_dir"], "confusion_matrix.png")
-    plot_confusion_matrix(np.array(metrics["confusion_matrix"]), cm_path)
-    print(f"Confusion matrix saved to {cm_path}")
-    
-    # Plot and save per-class metrics
     per_class_path = os.path.join(config["output_dir"], "per_class_metrics.png")
-    plot_per_class_metrics(metrics["per_class_metrics"], per_class_path)
-    print(f"Per-class metrics saved to {per_class_path}")
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        cm_future = executor.submit(plot_confusion_matrix, metrics["confusion_matrix"], cm_path)
+        per_class_future = executor.submit(plot_per_class_metrics, metrics["per_class_metrics"], per_class_path)
+        
+        # Save metrics to file
+        metrics_path = os.path.join(config["output_dir"], "evaluation_metrics.json")
+        Path(metrics_path).write_bytes(
+            orjson.dumps(metrics, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY)
+        )
+        print(f"Metrics saved to {metrics_path}")
+        
+        cm_future.result()
+        print(f"Confusion matrix saved to {cm_path}")
+        per_class_future.result()
+        print(f"Per-class metrics saved to {per_class_path}")
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Evaluate emotion detection model")
     parser.add_argument("--model_path", type=str, help="Path to the model file")
     parser.add_argument("--test_data", type=str, help="Path to the test data file")
     parser.add_argument("--batch_size", type=int, help="Batch size for evaluation")
+    parser.add_argument("--quantize", action="store_true",
+                        help="Use int8 dynamic quantization for CPU evaluation")
     args = parser.parse_args()
     
     main(args)
\ No newline at end of file
@@ -15,7 +15,7 @@ import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
 from sklearn.metrics import accuracy_score, precision_recall_fscore_support
-from sklearn.metrics import confusion_matrix, classification_report, roc_curve, auc
+from sklearn.metrics import classification_report, roc_curve, auc
 from sklearn.model_selection import train_test_split
 import time
 import random
@@ -205,8 +205,19 @@ class EmotionModelEvaluator:
         print_result("Recall", recall)
         print_result("F1 Score", f1)
         
-        # Generate confusion matrix
-        cm = confusion_matrix(self.y_test, predictions, labels=self.emotion_labels)
+        # Map emotions to label ids once (-1 for emotions outside emotion_labels)
+        n = len(self.emotion_labels)
+        label_index = pd.Index(self.emotion_labels)
+        y_true_ids = label_index.get_indexer(self.y_test).astype(np.int64)
+        y_pred_ids = label_index.get_indexer(predictions).astype(np.int64)
+        known = (y_true_ids >= 0) & (y_pred_ids >= 0)
+        dropped = int((~known).sum())
+        if dropped:
+            print(f"Confusion matrix skips {dropped} rows with emotions outside the label set")
+        
+        # Generate confusion matrix: one bincount over flattened (true, predicted) pairs
+        flat_ids = n * y_true_ids[known] + y_pred_ids[known]
+        cm = np.bincount(flat_ids, minlength=n * n).reshape(n, n)
         
         # Calculate per-class metrics
         report = classification_report(self.y_test, predictions, output_dict=True)